@@ -1,10 +1,13 @@
 from django.contrib import admin
+from django.db import transaction
 from django.utils.html import format_html
 from .api.models import (
     User, EmailVerification, InstitutionDomain, MatchProfile, Match,
     ChatRoom, ChatMessage, Sticker, Gift, Notification, Subscription,
     AbuseReport, AdminLog, PaymentReminder
 )
+from .api.realtime import broadcast_room_state
+from .api import chat_expiry
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
@@ -50,19 +53,24 @@ class ChatRoomAdmin(admin.ModelAdmin):
     
     def lock_chat(self, request, queryset):
         from django.utils import timezone
+        room_ids = list(queryset.values_list('id', flat=True))
         queryset.update(is_locked=True, locked_at=timezone.now())
+        transaction.on_commit(lambda: broadcast_room_state(room_ids))
     lock_chat.short_description = "Lock selected chats"
     
     def unlock_chat(self, request, queryset):
+        room_ids = list(queryset.values_list('id', flat=True))
         queryset.update(is_locked=False, locked_at=None)
+        transaction.on_commit(lambda: broadcast_room_state(room_ids))
     unlock_chat.short_description = "Unlock selected chats"
     
     def extend_chat(self, request, queryset):
         from django.utils import timezone
         from datetime import timedelta
-        for room in queryset:
-            room.expires_at = timezone.now() + timedelta(days=7)
-            room.save()
+        expires_at = timezone.now() + timedelta(days=7)
+        room_ids = list(queryset.values_list('id', flat=True))
+        queryset.update(expires_at=expires_at)
+        transaction.on_commit(lambda: chat_expiry.schedule((room_id, expires_at) for room_id in room_ids))
     extend_chat.short_description = "Extend selected chats by 7 days"
 
 @admin.register(Sticker)
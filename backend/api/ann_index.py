@@ -0,0 +1,162 @@
+import math
+import threading
+import time
+import zlib
+import logging
+import numpy as np
+from django.conf import settings
+from .candidate_index import candidate_index
+
+logger = logging.getLogger(__name__)
+
+INTEREST_DIMS = 64
+HASHED_SEGMENTS = (
+    ('city', 32, 0.25 * 0.5),
+    ('state', 16, 0.25 * 0.3),
+    ('country', 16, 0.25 * 0.2),
+    ('degree', 16, 0.05 * 0.6),
+    ('profession', 16, 0.05 * 0.4),
+)
+DIMS = INTEREST_DIMS + sum(size for _, size, _ in HASHED_SEGMENTS) + 4
+
+TARGET_BUCKET_SIZE = 256
+BUILD_CHUNK_SIZE = 10000
+
+
+def _angle_pair(value, low, span, weight):
+    # Numeric attributes become a point on a quarter circle, so the dot
+    # product of two users falls off smoothly with their difference.
+    if not value:
+        return (0.0, 0.0)
+    theta = min(max((value - low) / span, 0.0), 1.0) * (math.pi / 2)
+    scale = math.sqrt(weight)
+    return (math.cos(theta) * scale, math.sin(theta) * scale)
+
+
+def embed(candidate):
+    """Fixed-length feature vector weighted like MatchingEngine.weights."""
+    vector = np.zeros(DIMS, dtype=np.float32)
+
+    if candidate.interest_ids:
+        for interest_id in candidate.interest_ids:
+            vector[interest_id % INTEREST_DIMS] += 1.0
+        segment = vector[:INTEREST_DIMS]
+        segment *= math.sqrt(0.35) / np.linalg.norm(segment)
+
+    offset = INTEREST_DIMS
+    for field, size, weight in HASHED_SEGMENTS:
+        value = (getattr(candidate, field) or '').lower()
+        if value:
+            vector[offset + zlib.crc32(value.encode()) % size] = math.sqrt(weight)
+        offset += size
+
+    vector[offset:offset + 2] = _angle_pair(candidate.age, 18, 82, 0.20)
+    vector[offset + 2:offset + 4] = _angle_pair(candidate.height_cm, 140, 80, 0.15)
+    return vector
+
+
+class AnnIndex:
+    """
+    Random-projection LSH over candidate embeddings for large scopes.
+
+    Each of MATCHING_ANN_TABLES tables hashes an embedding to a K-bit code
+    (K grows with log2 of the population), stored as sorted code/id arrays
+    so a bucket lookup is a binary search. Rebuilt from the candidate index
+    in a background thread once older than MATCHING_ANN_MAX_AGE; users who
+    left the candidate index since the last build are dropped by the
+    engine's filters.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built_at = None
+        self._state = None
+
+    def ensure_built(self):
+        max_age = getattr(settings, 'MATCHING_ANN_MAX_AGE', 900)
+        if self._built_at is not None and time.monotonic() - self._built_at < max_age:
+            return
+
+        if self._built_at is None:
+            # Nothing to serve yet, so only the first build blocks callers.
+            with self._lock:
+                if self._built_at is None:
+                    self.rebuild()
+            return
+
+        # Stale: keep answering from the current tables while one thread rebuilds.
+        if self._lock.acquire(blocking=False):
+            threading.Thread(target=self._rebuild_in_background, name='ann-index-rebuild', daemon=True).start()
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception("ANN index rebuild failed")
+        finally:
+            self._lock.release()
+
+    def rebuild(self):
+        started = time.monotonic()
+        entries = candidate_index.entries(candidate_index.scope_ids())
+        tables = getattr(settings, 'MATCHING_ANN_TABLES', 8)
+        bits = max(1, min(24, round(math.log2(max(len(entries), 1) / TARGET_BUCKET_SIZE))))
+
+        rng = np.random.default_rng()
+        planes = rng.standard_normal((DIMS, tables * bits)).astype(np.float32)
+
+        ids = np.fromiter((entry.id for entry in entries), dtype=np.int64, count=len(entries))
+        codes = np.zeros((len(entries), tables), dtype=np.uint32)
+        for start in range(0, len(entries), BUILD_CHUNK_SIZE):
+            chunk = entries[start:start + BUILD_CHUNK_SIZE]
+            vectors = np.stack([embed(entry) for entry in chunk])
+            codes[start:start + len(chunk)] = self._hash(vectors, planes, tables, bits)
+
+        sorted_codes, sorted_ids = [], []
+        for table in range(tables):
+            order = np.argsort(codes[:, table], kind='stable')
+            sorted_codes.append(codes[order, table])
+            sorted_ids.append(ids[order])
+
+        self._state = (planes, tables, bits, sorted_codes, sorted_ids)
+        self._built_at = time.monotonic()
+
+        logger.info(
+            f"ANN index rebuilt with {len(entries)} users, {tables}x{bits}-bit tables "
+            f"in {(time.monotonic() - started) * 1000:.1f}ms"
+        )
+
+    @staticmethod
+    def _hash(vectors, planes, tables, bits):
+        signs = (vectors @ planes) > 0
+        weights = (1 << np.arange(bits, dtype=np.uint32))
+        return (signs.reshape(len(vectors), tables, bits) * weights).sum(axis=2).astype(np.uint32)
+
+    def query(self, candidate, limit):
+        self.ensure_built()
+        planes, tables, bits, codes, ids = self._state
+
+        query_codes = self._hash(embed(candidate)[np.newaxis, :], planes, tables, bits)[0]
+        found = set()
+
+        for table in range(tables):
+            found.update(self._bucket(codes[table], ids[table], query_codes[table]))
+
+        # Multi-probe: widen to buckets one bit away until enough candidates.
+        for bit in range(bits):
+            if len(found) >= limit:
+                break
+            for table in range(tables):
+                probe = query_codes[table] ^ np.uint32(1 << bit)
+                found.update(self._bucket(codes[table], ids[table], probe))
+
+        return found
+
+    @staticmethod
+    def _bucket(codes, ids, code):
+        low = np.searchsorted(codes, code, side='left')
+        high = np.searchsorted(codes, code, side='right')
+        return ids[low:high].tolist()
+
+
+ann_index = AnnIndex()
@@ -0,0 +1,83 @@
+import time
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .redis_client import get_redis
+from redis.exceptions import RedisError
+import logging
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_TTL = 7 * 24 * 60 * 60
+RAW_DELETE_SQL = 'DELETE FROM {table} WHERE {pk} = ANY(%s)'
+
+def progress_key(label):
+    return f'batch_delete:{label}'
+
+def _record_progress(label, **fields):
+    try:
+        pipe = get_redis().pipeline()
+        pipe.hset(progress_key(label), mapping={key: str(value) for key, value in fields.items()})
+        pipe.expire(progress_key(label), PROGRESS_TTL)
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Failed to record {label} progress: {str(e)}")
+
+def _raw_delete(model, ids):
+    sql = RAW_DELETE_SQL.format(
+        table=connection.ops.quote_name(model._meta.db_table),
+        pk=connection.ops.quote_name(model._meta.pk.column),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [ids])
+        return cursor.rowcount
+
+def delete_in_batches(queryset, label, raw=False, fields=(), before_delete=None, after_delete=None,
+                      batch_size=None, pause=None):
+    """
+    Delete queryset in primary-key chunks, each in its own short transaction,
+    sleeping between chunks so cleanup never holds long locks or saturates
+    the database.
+
+    raw=True issues a plain DELETE and skips Django's collector, so it is
+    only for models with no dependent rows and no delete signals.
+    before_delete(rows) runs just before each chunk's transaction and
+    after_delete(rows) after it commits; rows are (pk, *fields) tuples.
+    Progress for the current run is kept in the batch_delete:<label> hash.
+    """
+    batch_size = batch_size or settings.CLEANUP_BATCH_SIZE
+    pause = settings.CLEANUP_BATCH_PAUSE if pause is None else pause
+    model = queryset.model
+    started = time.monotonic()
+    deleted = 0
+    batches = 0
+    
+    _record_progress(label, started_at=timezone.now().isoformat(), finished_at='', deleted=0, batches=0)
+    
+    while True:
+        rows = list(queryset.order_by().values_list('pk', *fields)[:batch_size])
+        if not rows:
+            break
+        ids = [row[0] for row in rows]
+        
+        if before_delete:
+            before_delete(rows)
+        with transaction.atomic():
+            if raw:
+                deleted += _raw_delete(model, ids)
+            else:
+                deleted += model._base_manager.filter(pk__in=ids).delete()[1].get(model._meta.label, 0)
+        if after_delete:
+            after_delete(rows)
+        
+        batches += 1
+        _record_progress(label, deleted=deleted, batches=batches)
+        if len(rows) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    
+    elapsed = time.monotonic() - started
+    _record_progress(label, finished_at=timezone.now().isoformat(), seconds=f'{elapsed:.1f}')
+    logger.info(f"{label}: deleted {deleted} {model._meta.verbose_name_plural} in {batches} batches ({elapsed:.1f}s)")
+    return deleted
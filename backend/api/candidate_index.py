@@ -0,0 +1,363 @@
+import threading
+import time
+import logging
+from collections import defaultdict
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from .models import Interest, MatchProfile, User
+
+logger = logging.getLogger(__name__)
+
+SCOPE_FIELDS = ('domain', 'city', 'state', 'country')
+INDEXED_USER_FIELDS = frozenset([
+    'email', 'is_verified', 'is_institutional', 'is_banned',
+    'gender', 'age', 'height_cm', 'city', 'state', 'country',
+    'interests', 'degree', 'profession',
+])
+
+COLUMN_FIELDS = (
+    'id', 'city', 'state', 'country', 'degree', 'profession', 'age', 'height_cm', 'interest_count',
+)
+
+
+def email_domain(email):
+    return (email or '').rpartition('@')[2].lower()
+
+
+class CandidateEntry:
+    __slots__ = (
+        'id', 'domain', 'city', 'state', 'country', 'gender', 'age', 'height_cm',
+        'interest_ids', 'degree', 'profession',
+    )
+
+    def __init__(self, id, email, city, state, country, gender, age, height_cm,
+                 interest_ids, degree, profession):
+        self.id = id
+        self.domain = email_domain(email)
+        self.city = city
+        self.state = state
+        self.country = country
+        self.gender = gender
+        self.age = age
+        self.height_cm = height_cm
+        self.interest_ids = tuple(interest_ids or ())[:Interest.MAX_PER_USER]
+        self.degree = degree
+        self.profession = profession
+
+
+class Vocabulary:
+    """Interns values to small integer codes; code() maps blanks to -1."""
+
+    def __init__(self):
+        self._codes = {}
+        self._lock = threading.Lock()
+
+    def intern(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self._codes.setdefault(value, len(self._codes))
+        return code
+
+    def code(self, value):
+        if not value:
+            return -1
+        return self.intern(value)
+
+
+place_vocabulary = Vocabulary()
+education_vocabulary = Vocabulary()
+
+
+class CandidateColumns:
+    """
+    Scoring features as parallel int64 arrays, one row per candidate: place
+    and lowercased education codes (-1 when blank), age and height (0 when
+    unknown), and interest ids left-aligned in a matrix padded with -1.
+    """
+    __slots__ = (*COLUMN_FIELDS, 'interests')
+
+    def __init__(self, capacity=0, interest_width=0):
+        for field in COLUMN_FIELDS:
+            setattr(self, field, np.zeros(capacity, dtype=np.int64))
+        self.interests = np.full((capacity, interest_width), -1, dtype=np.int64)
+
+    @classmethod
+    def of(cls, candidates):
+        """Encodes Users or CandidateEntry objects into a new instance."""
+        width = min(max((len(c.interest_ids) for c in candidates), default=0), Interest.MAX_PER_USER)
+        columns = cls(len(candidates), width)
+        for row, candidate in enumerate(candidates):
+            columns.put(row, candidate)
+        return columns
+
+    def __len__(self):
+        return len(self.id)
+
+    def take(self, rows):
+        taken = CandidateColumns.__new__(CandidateColumns)
+        for field in COLUMN_FIELDS:
+            setattr(taken, field, getattr(self, field)[rows])
+        taken.interests = self.interests[rows]
+        return taken
+
+    def put(self, row, candidate):
+        # Capped so one oversized profile cannot widen the matrix for everyone.
+        interest_ids = candidate.interest_ids[:Interest.MAX_PER_USER]
+        capacity, width = self.interests.shape
+        if row >= capacity:
+            capacity = max(row + 1, 2 * capacity, 1024)
+        if capacity > self.interests.shape[0] or len(interest_ids) > width:
+            self._resize(capacity, max(width, len(interest_ids)))
+
+        self.id[row] = candidate.id
+        for field in ('city', 'state', 'country'):
+            getattr(self, field)[row] = place_vocabulary.code(getattr(candidate, field))
+        for field in ('degree', 'profession'):
+            getattr(self, field)[row] = education_vocabulary.code((getattr(candidate, field) or '').lower())
+        self.age[row] = candidate.age or 0
+        self.height_cm[row] = candidate.height_cm or 0
+        self.interest_count[row] = len(interest_ids)
+        self.interests[row] = -1
+        self.interests[row, :len(interest_ids)] = interest_ids
+
+    def _resize(self, capacity, width):
+        for field in COLUMN_FIELDS:
+            values = np.zeros(capacity, dtype=np.int64)
+            old = getattr(self, field)
+            values[:len(old)] = old
+            setattr(self, field, values)
+        interests = np.full((capacity, width), -1, dtype=np.int64)
+        interests[:self.interests.shape[0], :self.interests.shape[1]] = self.interests
+        self.interests = interests
+
+
+class CandidateIndex:
+    """
+    In-process index of matchable users (verified, institutional, not banned,
+    match profile not paused), bucketed by scope key, gender, age and height.
+
+    Built lazily from the database and kept current by the User/MatchProfile
+    signals. Each process holds its own copy, so it is also rebuilt once it
+    is older than MATCHING_INDEX_MAX_AGE to pick up writes made elsewhere;
+    that rebuild runs in a background thread while the old copy is served.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._rebuild_lock = threading.Lock()
+        self._built_at = None
+        self._reset()
+
+    def _reset(self):
+        self._entries = {}
+        self._rows = {}
+        self._free_rows = []
+        self._columns = CandidateColumns()
+        self._inactive = set()
+        self._all = set()
+        self._scope = {field: defaultdict(set) for field in SCOPE_FIELDS}
+        self._gender = defaultdict(set)
+        self._age = defaultdict(set)
+        self._height = defaultdict(set)
+
+    @property
+    def is_built(self):
+        return self._built_at is not None
+
+    def ensure_built(self):
+        max_age = getattr(settings, 'MATCHING_INDEX_MAX_AGE', 300)
+        if self._built_at is not None and time.monotonic() - self._built_at < max_age:
+            return
+
+        if self._built_at is None:
+            # Nothing to serve yet, so only the first build blocks callers.
+            with self._rebuild_lock:
+                if self._built_at is None:
+                    self.rebuild()
+            return
+
+        # Stale: keep serving the current snapshot while one thread rebuilds.
+        if self._rebuild_lock.acquire(blocking=False):
+            threading.Thread(
+                target=self._rebuild_in_background, name='candidate-index-rebuild', daemon=True,
+            ).start()
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception("Candidate index rebuild failed")
+        finally:
+            connection.close()
+            self._rebuild_lock.release()
+
+    def rebuild(self):
+        started = time.monotonic()
+        fresh = CandidateIndex.__new__(CandidateIndex)
+        fresh._reset()
+        fresh._inactive = set(
+            MatchProfile.objects.filter(is_active=False).values_list('user_id', flat=True)
+        )
+
+        rows = User.objects.filter(
+            is_verified=True,
+            is_banned=False,
+            is_institutional=True,
+        ).values_list(
+            'id', 'email', 'city', 'state', 'country', 'gender', 'age', 'height_cm',
+            'interest_ids', 'degree', 'profession',
+        ).iterator(chunk_size=5000)
+
+        for row in rows:
+            if row[0] not in fresh._inactive:
+                fresh._insert(CandidateEntry(*row))
+
+        with self._lock:
+            self._entries = fresh._entries
+            self._rows = fresh._rows
+            self._free_rows = fresh._free_rows
+            self._columns = fresh._columns
+            self._inactive = fresh._inactive
+            self._all = fresh._all
+            self._scope = fresh._scope
+            self._gender = fresh._gender
+            self._age = fresh._age
+            self._height = fresh._height
+            self._built_at = time.monotonic()
+
+        logger.info(
+            f"Candidate index rebuilt with {len(self._entries)} users "
+            f"in {(time.monotonic() - started) * 1000:.1f}ms"
+        )
+
+    def _insert(self, entry):
+        self._entries[entry.id] = entry
+        row = self._free_rows.pop() if self._free_rows else len(self._rows)
+        self._rows[entry.id] = row
+        self._columns.put(row, entry)
+        self._all.add(entry.id)
+        for field in SCOPE_FIELDS:
+            self._scope[field][getattr(entry, field)].add(entry.id)
+        self._gender[entry.gender].add(entry.id)
+        if entry.age is not None:
+            self._age[entry.age].add(entry.id)
+        if entry.height_cm is not None:
+            self._height[entry.height_cm].add(entry.id)
+
+    def _discard(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return
+
+        self._free_rows.append(self._rows.pop(user_id))
+        self._all.discard(user_id)
+        for field in SCOPE_FIELDS:
+            self._discard_from_bucket(self._scope[field], getattr(entry, field), user_id)
+        self._discard_from_bucket(self._gender, entry.gender, user_id)
+        self._discard_from_bucket(self._age, entry.age, user_id)
+        self._discard_from_bucket(self._height, entry.height_cm, user_id)
+
+    @staticmethod
+    def _discard_from_bucket(buckets, key, user_id):
+        bucket = buckets.get(key)
+        if bucket is None:
+            return
+        bucket.discard(user_id)
+        if not bucket:
+            del buckets[key]
+
+    def update_user(self, user):
+        if not self.is_built:
+            return
+
+        with self._lock:
+            self._discard(user.id)
+            if (
+                user.is_verified and user.is_institutional and not user.is_banned
+                and user.id not in self._inactive
+            ):
+                self._insert(CandidateEntry(
+                    user.id, user.email, user.city, user.state, user.country,
+                    user.gender, user.age, user.height_cm,
+                    user.interest_ids, user.degree, user.profession,
+                ))
+
+    def remove_user(self, user_id):
+        if not self.is_built:
+            return
+
+        with self._lock:
+            self._discard(user_id)
+
+    def set_profile_active(self, user, is_active):
+        if not self.is_built:
+            return
+
+        with self._lock:
+            if is_active:
+                self._inactive.discard(user.id)
+            else:
+                self._inactive.add(user.id)
+        self.update_user(user)
+
+    def entries(self, user_ids):
+        with self._lock:
+            return [self._entries[user_id] for user_id in user_ids if user_id in self._entries]
+
+    def columns(self, user_ids):
+        """Scoring columns for the indexed users among user_ids, in order."""
+        with self._lock:
+            rows = [self._rows[user_id] for user_id in user_ids if user_id in self._rows]
+            return self._columns.take(np.array(rows, dtype=np.intp))
+
+    def scope_ids(self, field=None, value=None):
+        with self._lock:
+            if field is None:
+                return set(self._all)
+            return set(self._scope[field].get(value, ()))
+
+    def age_ids(self, min_age, max_age):
+        return self._range_ids(self._age, min_age, max_age)
+
+    def height_ids(self, min_cm, max_cm):
+        return self._range_ids(self._height, min_cm, max_cm)
+
+    def intersect_gender(self, user_ids, gender):
+        with self._lock:
+            return user_ids & self._gender.get(gender, set())
+
+    def intersect_scope(self, user_ids, field, value):
+        with self._lock:
+            return user_ids & self._scope[field].get(value, set())
+
+    def restrict(self, user_ids, min_age, max_age, min_height=None, max_height=None, check_height=False):
+        # Per-entry checks; cheaper than range unions when user_ids is small.
+        result = set()
+        with self._lock:
+            for user_id in user_ids:
+                entry = self._entries.get(user_id)
+                if entry is None or entry.age is None:
+                    continue
+                if not min_age <= entry.age <= max_age:
+                    continue
+                if check_height and (
+                    entry.height_cm is None
+                    or (min_height is not None and entry.height_cm < min_height)
+                    or (max_height is not None and entry.height_cm > max_height)
+                ):
+                    continue
+                result.add(user_id)
+        return result
+
+    def _range_ids(self, buckets, low, high):
+        result = set()
+        with self._lock:
+            for key, ids in buckets.items():
+                if (low is None or key >= low) and (high is None or key <= high):
+                    result |= ids
+        return result
+
+
+candidate_index = CandidateIndex()
@@ -0,0 +1,41 @@
+from .redis_client import get_redis
+from redis.exceptions import RedisError
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Sorted set of unlocked chat room ids scored by expires_at, so the
+# expire_due_chats task pops exactly the rooms that are due instead of
+# scanning the table. expire_chats remains as an hourly sweep and re-adds
+# rooms expiring soon, which repairs the set after Redis data loss.
+
+KEY = 'chat_expiry'
+
+# Drop a member only if it was not rescheduled past the cutoff meanwhile.
+_RELEASE_SCRIPT = """
+for i = 1, #ARGV - 1 do
+    local score = redis.call('ZSCORE', KEYS[1], ARGV[i])
+    if score and tonumber(score) <= tonumber(ARGV[#ARGV]) then
+        redis.call('ZREM', KEYS[1], ARGV[i])
+    end
+end
+return 0
+"""
+
+def schedule(rooms):
+    """rooms: iterable of (room_id, expires_at)."""
+    mapping = {str(room_id): expires_at.timestamp() for room_id, expires_at in rooms}
+    if not mapping:
+        return
+    try:
+        get_redis().zadd(KEY, mapping)
+    except RedisError as e:
+        logger.warning(f"Failed to schedule chat expiry: {str(e)}")
+
+def due(now, limit):
+    return get_redis().zrangebyscore(KEY, '-inf', now.timestamp(), start=0, num=limit)
+
+def release(room_ids, now):
+    if room_ids:
+        script = get_redis().register_script(_RELEASE_SCRIPT)
+        script(keys=[KEY], args=[*room_ids, now.timestamp()])
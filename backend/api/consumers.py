@@ -1,9 +1,17 @@
-import json
+import asyncio
 import logging
+import time
+import uuid
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.conf import settings
 from django.utils import timezone
 from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ValidationError
+from redis.exceptions import RedisError
+from . import framing, message_stream, presence, receipts, room_activity, unread
+from .rate_limit import ws_rate_limiter
+from .realtime import room_group_name
 import secrets
 
 logger = logging.getLogger(__name__)
@@ -12,14 +20,26 @@ class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.room_id = self.scope['url_route']['kwargs']['room_id']
         self.user = self.scope['user']
-        self.room_group_name = f'chat_{self.room_id}'
+        self.room_group_name = room_group_name(self.room_id)
+        self.room = None
+        self.other_user = None
+        self.seen_up_to = None
+        self.binary = False
+        self.is_typing = False
+        self.typing_wanted = False
+        self._typing_emitted_at = 0
+        self._typing_refreshed_at = 0
+        self._typing_flush = None
+        self._typing_timeout = None
+        self.rate_buckets = ws_rate_limiter.connection_buckets()
+        self.rate_limited = 0
         
         if isinstance(self.user, AnonymousUser):
             await self.close()
             return
         
-        has_access = await self._verify_access()
-        if not has_access:
+        has_access = await self._load_room()
+        if not has_access or self._check_locked():
             await self.close()
             return
         
@@ -27,19 +47,34 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.room_group_name,
             self.channel_name
         )
-        await self.accept()
         
-        other_user = await self._get_other_user()
+        self.binary = framing.MSGPACK_SUBPROTOCOL in self.scope.get('subprotocols', [])
+        await self.accept(subprotocol=framing.MSGPACK_SUBPROTOCOL if self.binary else None)
+        
+        other_user = self.other_user
         if other_user:
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'user_joined',
-                    'user': self.user.anonymous_handle,
-                }
-            )
+            await self._broadcast('user_joined', {
+                'type': 'user_joined',
+                'user': self.user.anonymous_handle,
+            }, exclude_self=True)
+            
+            try:
+                other_is_typing = await presence.is_typing(self.room_id, other_user.id)
+            except RedisError:
+                other_is_typing = False
+            if other_is_typing:
+                await self.send_event({
+                    'type': 'typing',
+                    'user': other_user.anonymous_handle,
+                    'is_typing': True,
+                })
     
     async def disconnect(self, close_code):
+        if self.room is None:
+            return
+        
+        self._cancel_typing_tasks()
+        
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
@@ -47,25 +82,27 @@ class ChatConsumer(AsyncWebsocketConsumer):
         
         await self._remove_typing_indicator()
         
-        other_user = await self._get_other_user()
+        other_user = self.other_user
         if other_user:
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'user_left',
-                    'user': self.user.anonymous_handle,
-                }
-            )
+            await self._broadcast('user_left', {
+                'type': 'user_left',
+                'user': self.user.anonymous_handle,
+            }, exclude_self=True)
     
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         try:
-            data = json.loads(text_data)
-        except json.JSONDecodeError:
-            await self.send(text_data=json.dumps({'error': 'Invalid JSON'}))
+            data = framing.decode(text_data, bytes_data)
+        except framing.FrameError:
+            await self.send_event({'error': 'Invalid MessagePack' if bytes_data is not None else 'Invalid JSON'})
             return
         
         message_type = data.get('type')
         
+        if not await ws_rate_limiter.allow(self.user.id, message_type, self.rate_buckets):
+            await self._reject_rate_limited(message_type)
+            return
+        self.rate_limited = 0
+        
         if message_type == 'message':
             await self._handle_message(data)
         elif message_type == 'typing':
@@ -73,7 +110,21 @@ class ChatConsumer(AsyncWebsocketConsumer):
         elif message_type == 'seen':
             await self._handle_seen(data)
         else:
-            await self.send(text_data=json.dumps({'error': 'Unknown message type'}))
+            await self.send_event({'error': 'Unknown message type'})
+    
+    async def _reject_rate_limited(self, message_type):
+        # Rejected before any database or channel-layer work. Dropped typing
+        # and seen events are silent; a flood that keeps going is closed.
+        self.rate_limited += 1
+        if self.rate_limited >= settings.WS_RATE_LIMIT_CLOSE_AFTER:
+            logger.warning(f"Closing WebSocket for user {self.user.id}: rate limit exceeded")
+            await self.close(code=4008)
+            return
+        if message_type == 'message':
+            await self.send_event({'error': 'Rate limit exceeded'})
+    
+    async def send_event(self, payload):
+        await self.send(**framing.encode(payload, self.binary))
     
     async def _handle_message(self, data):
         msg_type = data.get('message_type', 'text')
@@ -81,202 +132,288 @@ class ChatConsumer(AsyncWebsocketConsumer):
         media_url = data.get('media_url', '')
         
         if not content and not media_url:
-            await self.send(text_data=json.dumps({'error': 'Empty message'}))
+            await self.send_event({'error': 'Empty message'})
+            return
+        
+        error = message_stream.validate(msg_type, content, media_url)
+        if error:
+            await self.send_event({'error': error})
             return
         
-        is_locked = await self._check_locked()
-        if is_locked:
-            await self.send(text_data=json.dumps({'error': 'Chat room is locked'}))
+        if self._check_locked():
+            await self.send_event({'error': 'Chat room is locked'})
             return
         
-        message = await self._save_message(msg_type, content, media_url)
+        if settings.CHAT_WRITE_BEHIND_ENABLED:
+            message_id, created_at = await self._enqueue_message(msg_type, content, media_url)
+        else:
+            message = await self._save_message(msg_type, content, media_url)
+            message_id, created_at = message.id, message.created_at
         
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'chat_message',
-                'message_id': str(message.id),
-                'sender': self.user.anonymous_handle,
-                'message_type': msg_type,
-                'content': content,
-                'media_url': media_url,
-                'timestamp': message.created_at.isoformat(),
-            }
-        )
+        await unread.message_created_async(self.room_id, self.other_user.id)
+        
+        await self._broadcast('chat_message', {
+            'type': 'message',
+            'message_id': str(message_id),
+            'sender': self.user.anonymous_handle,
+            'message_type': msg_type,
+            'content': content,
+            'media_url': media_url,
+            'timestamp': created_at.isoformat(),
+        })
         
+        # Sending ends typing; recipients clear the indicator on the message.
+        self._cancel_typing_tasks()
+        self.is_typing = self.typing_wanted = False
         await self._remove_typing_indicator()
     
     async def _handle_typing(self, data):
-        is_typing = data.get('is_typing', False)
+        is_typing = bool(data.get('is_typing', False))
         
         if is_typing:
+            if self._typing_timeout is not None:
+                self._typing_timeout.cancel()
+            self._typing_timeout = asyncio.create_task(self._expire_typing())
+            
+            refresh_after = settings.TYPING_INDICATOR_TTL / 2
+            if self.is_typing and time.monotonic() - self._typing_refreshed_at >= refresh_after:
+                self._typing_refreshed_at = time.monotonic()
+                await self._add_typing_indicator()
+        elif self._typing_timeout is not None:
+            self._typing_timeout.cancel()
+            self._typing_timeout = None
+        
+        await self._set_typing(is_typing)
+    
+    # Typing is shaped per connection: only state changes are broadcast, no
+    # more often than TYPING_MIN_INTERVAL (a change inside the window is sent
+    # at its end if it still holds), and a client that goes quiet for
+    # TYPING_IDLE_TIMEOUT is reported as stopped.
+    
+    async def _set_typing(self, is_typing):
+        self.typing_wanted = is_typing
+        if self._typing_flush is not None:
+            return
+        
+        wait = self._typing_emitted_at + settings.TYPING_MIN_INTERVAL / 1000 - time.monotonic()
+        if wait > 0:
+            self._typing_flush = asyncio.create_task(self._flush_typing_later(wait))
+            return
+        await self._flush_typing()
+    
+    async def _flush_typing_later(self, delay):
+        await asyncio.sleep(delay)
+        self._typing_flush = None
+        await self._flush_typing()
+    
+    async def _expire_typing(self):
+        await asyncio.sleep(settings.TYPING_IDLE_TIMEOUT)
+        self._typing_timeout = None
+        await self._set_typing(False)
+    
+    async def _flush_typing(self):
+        is_typing = self.typing_wanted
+        if is_typing == self.is_typing:
+            return
+        
+        self.is_typing = is_typing
+        self._typing_emitted_at = time.monotonic()
+        if is_typing:
+            self._typing_refreshed_at = self._typing_emitted_at
             await self._add_typing_indicator()
         else:
             await self._remove_typing_indicator()
         
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'typing_indicator',
-                'user': self.user.anonymous_handle,
-                'is_typing': is_typing,
-            }
-        )
+        await self._broadcast('typing_indicator', {
+            'type': 'typing',
+            'user': self.user.anonymous_handle,
+            'is_typing': is_typing,
+        }, exclude_self=True)
+    
+    def _cancel_typing_tasks(self):
+        for task in (self._typing_flush, self._typing_timeout):
+            if task is not None:
+                task.cancel()
+        self._typing_flush = self._typing_timeout = None
     
     async def _handle_seen(self, data):
+        # "Seen up to message_id": everything the other user sent until then
+        # is marked in one UPDATE, and only receipts that move the watermark
+        # reach the database or the group.
         message_id = data.get('message_id')
         
-        await self._mark_seen(message_id)
+        seen_up_to = await self._message_created_at(message_id)
+        if seen_up_to is None and settings.CHAT_WRITE_BEHIND_ENABLED:
+            # Not drained yet; the drain applies the watermark on insert.
+            try:
+                seen_up_to = await message_stream.pending_created_at(self.room_id, message_id)
+            except (RedisError, ValueError) as e:
+                logger.warning(f"Failed to resolve pending message {message_id}: {str(e)}")
+        if seen_up_to is None:
+            await self.send_event({'error': 'Unknown message'})
+            return
+        if self.seen_up_to is not None and seen_up_to <= self.seen_up_to:
+            return
+        self.seen_up_to = seen_up_to
+        
+        try:
+            advanced = await receipts.advance(self.room_id, self.user.id, seen_up_to)
+        except RedisError as e:
+            logger.warning(f"Failed to store seen watermark: {str(e)}")
+            advanced = True
+        if not advanced:
+            return
         
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'message_seen',
-                'message_id': message_id,
-                'user': self.user.anonymous_handle,
-            }
-        )
+        seen_at = timezone.now()
+        marked = await self._mark_seen_up_to(seen_up_to, seen_at)
+        if marked:
+            await unread.messages_seen_async(self.room_id, self.user.id, marked)
+        
+        await self._broadcast('message_seen', {
+            'type': 'seen',
+            'message_id': message_id,
+            'user': self.user.anonymous_handle,
+            'seen_at': seen_at.isoformat(),
+        })
+    
+    async def _broadcast(self, handler, payload, exclude_self=False):
+        # Frames are encoded once here in both wire formats; each recipient
+        # forwards the one it negotiated without re-serialising.
+        event = {'type': handler, 'frames': framing.prepare(payload)}
+        if exclude_self:
+            event['exclude_user'] = self.user.id
+        await self.channel_layer.group_send(self.room_group_name, event)
+    
+    async def _forward(self, event):
+        if event.get('exclude_user') == self.user.id:
+            return
+        await self.send(**framing.select(event['frames'], self.binary))
     
     async def chat_message(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'message',
-            'message_id': event['message_id'],
-            'sender': event['sender'],
-            'message_type': event['message_type'],
-            'content': event['content'],
-            'media_url': event['media_url'],
-            'timestamp': event['timestamp'],
-        }))
+        await self._forward(event)
     
     async def typing_indicator(self, event):
-        if event['user'] != self.user.anonymous_handle:
-            await self.send(text_data=json.dumps({
-                'type': 'typing',
-                'user': event['user'],
-                'is_typing': event['is_typing'],
-            }))
+        await self._forward(event)
     
     async def message_seen(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'seen',
-            'message_id': event['message_id'],
-            'user': event['user'],
-        }))
+        await self._forward(event)
     
     async def user_joined(self, event):
-        if event['user'] != self.user.anonymous_handle:
-            await self.send(text_data=json.dumps({
-                'type': 'user_joined',
-                'user': event['user'],
-            }))
+        await self._forward(event)
     
     async def user_left(self, event):
-        if event['user'] != self.user.anonymous_handle:
-            await self.send(text_data=json.dumps({
-                'type': 'user_left',
-                'user': event['user'],
-            }))
+        await self._forward(event)
     
-    @database_sync_to_async
-    def _verify_access(self):
-        from .models import ChatRoom
+    async def room_state(self, event):
+        has_access = await self._load_room()
+        if not has_access:
+            await self.close()
+            return
         
-        try:
-            room = ChatRoom.objects.get(id=self.room_id, is_deleted=False)
-            user = self.user
-            
-            if not (room.user_a == user or room.user_b == user):
-                return False
-            
-            if room.is_locked:
-                has_active_subscription = room.subscriptions.filter(
-                    user=user,
-                    status='success',
-                    expires_at__gt=timezone.now()
-                ).exists()
-                if not has_active_subscription:
-                    return False
-            
-            return True
-        except:
-            return False
+        await self.send_event({
+            'type': 'room_state',
+            'is_locked': self._check_locked(),
+            'expires_at': self.room.expires_at.isoformat(),
+        })
     
     @database_sync_to_async
-    def _get_other_user(self):
+    def _load_room(self):
         from .models import ChatRoom
         
         try:
-            room = ChatRoom.objects.get(id=self.room_id)
-            if room.user_a == self.user:
-                return room.user_b
-            else:
-                return room.user_a
-        except:
-            return None
+            room = ChatRoom.objects.select_related('user_a', 'user_b').get(
+                id=self.room_id,
+                is_deleted=False,
+            )
+        except (ChatRoom.DoesNotExist, ValidationError):
+            return False
+        
+        if room.user_a_id == self.user.id:
+            other_user = room.user_b
+        elif room.user_b_id == self.user.id:
+            other_user = room.user_a
+        else:
+            return False
+        
+        self.subscription_expires_at = None
+        if room.is_locked:
+            self.subscription_expires_at = room.subscriptions.filter(
+                user=self.user,
+                status='success',
+                expires_at__gt=timezone.now()
+            ).order_by('-expires_at').values_list('expires_at', flat=True).first()
+        
+        self.room = room
+        self.other_user = other_user
+        return True
     
-    @database_sync_to_async
     def _check_locked(self):
-        from .models import ChatRoom
-        
-        try:
-            room = ChatRoom.objects.get(id=self.room_id)
-            if room.is_locked:
-                has_subscription = room.subscriptions.filter(
-                    user=self.user,
-                    status='success',
-                    expires_at__gt=timezone.now()
-                ).exists()
-                return not has_subscription
+        if not self.room.is_locked:
             return False
-        except:
-            return True
+        expires_at = self.subscription_expires_at
+        return expires_at is None or expires_at <= timezone.now()
     
     @database_sync_to_async
     def _save_message(self, msg_type, content, media_url):
-        from .models import ChatMessage, ChatRoom
+        from .models import ChatMessage
         
-        room = ChatRoom.objects.get(id=self.room_id)
         message = ChatMessage.objects.create(
-            room=room,
+            room_id=self.room_id,
             sender=self.user,
             message_type=msg_type,
             content=content,
             media_url=media_url,
         )
         
-        room.last_activity = timezone.now()
-        room.save(update_fields=['last_activity'])
+        room_activity.touch_room(self.room_id, message.created_at)
         
         return message
     
-    @database_sync_to_async
-    def _add_typing_indicator(self):
-        from .models import TypingIndicator
+    async def _enqueue_message(self, msg_type, content, media_url):
+        message_id = uuid.uuid4()
+        created_at = timezone.now()
         
-        TypingIndicator.objects.update_or_create(
-            room_id=self.room_id,
-            user=self.user,
-            defaults={'created_at': timezone.now()}
-        )
+        try:
+            await message_stream.enqueue(
+                message_id, self.room_id, self.user.id, msg_type, content, media_url, created_at
+            )
+        except RedisError as e:
+            logger.warning(f"Write-behind enqueue failed, saving directly: {str(e)}")
+            message = await self._save_message(msg_type, content, media_url)
+            return message.id, message.created_at
+        
+        return message_id, created_at
+    
+    async def _add_typing_indicator(self):
+        try:
+            await presence.set_typing(self.room_id, self.user.id)
+        except RedisError as e:
+            logger.warning(f"Failed to store typing state: {str(e)}")
+    
+    async def _remove_typing_indicator(self):
+        try:
+            await presence.clear_typing(self.room_id, self.user.id)
+        except RedisError as e:
+            logger.warning(f"Failed to clear typing state: {str(e)}")
     
     @database_sync_to_async
-    def _remove_typing_indicator(self):
-        from .models import TypingIndicator
+    def _message_created_at(self, message_id):
+        from .models import ChatMessage
         
-        TypingIndicator.objects.filter(
-            room_id=self.room_id,
-            user=self.user
-        ).delete()
+        try:
+            return ChatMessage.objects.filter(
+                id=message_id,
+                room_id=self.room_id,
+            ).values_list('created_at', flat=True).first()
+        except ValidationError:
+            return None
     
     @database_sync_to_async
-    def _mark_seen(self, message_id):
+    def _mark_seen_up_to(self, seen_up_to, seen_at):
         from .models import ChatMessage
         
-        try:
-            message = ChatMessage.objects.get(id=message_id)
-            if message.sender != self.user:
-                message.is_seen = True
-                message.seen_at = timezone.now()
-                message.save(update_fields=['is_seen', 'seen_at'])
-        except:
-            pass
+        return ChatMessage.objects.filter(
+            room_id=self.room_id,
+            created_at__lte=seen_up_to,
+            is_seen=False,
+        ).exclude(sender=self.user).update(is_seen=True, seen_at=seen_at)
@@ -0,0 +1,39 @@
+from django.conf import settings
+from .redis_client import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+def feed_key(user_id):
+    return f'match_feed:{user_id}'
+
+def write_feed(user_id, ranked):
+    key = feed_key(user_id)
+    pipe = get_redis().pipeline()
+    pipe.delete(key)
+    if ranked:
+        pipe.zadd(key, {str(candidate_id): score for candidate_id, score in ranked})
+    else:
+        # An empty marker keeps "no candidates" distinguishable from "not built".
+        pipe.zadd(key, {'': -1})
+    pipe.expire(key, settings.MATCHING_FEED_TTL)
+    pipe.execute()
+
+def read_feed(user_id, offset, limit):
+    key = feed_key(user_id)
+    pipe = get_redis().pipeline()
+    pipe.exists(key)
+    pipe.zrevrangebyscore(key, '+inf', 0, start=offset, num=limit, withscores=True)
+    exists, rows = pipe.execute()
+    if not exists:
+        return None
+    return [(int(member), score) for member, score in rows]
+
+def remove_pair(user_a_id, user_b_id):
+    pipe = get_redis().pipeline()
+    pipe.zrem(feed_key(user_a_id), str(user_b_id))
+    pipe.zrem(feed_key(user_b_id), str(user_a_id))
+    pipe.execute()
+
+def invalidate_feed(user_id):
+    get_redis().delete(feed_key(user_id))
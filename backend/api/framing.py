@@ -0,0 +1,71 @@
+import json
+import msgpack
+
+# WebSocket wire formats. JSON text frames are the default; clients that
+# offer the MessagePack subprotocol at connect get binary frames with the
+# short keys below instead of the full field names.
+
+MSGPACK_SUBPROTOCOL = 'chat.msgpack.v1'
+
+FIELD_CODES = {
+    'type': 't',
+    'message_id': 'i',
+    'sender': 's',
+    'message_type': 'k',
+    'content': 'c',
+    'media_url': 'm',
+    'timestamp': 'ts',
+    'user': 'u',
+    'is_typing': 'y',
+    'seen_at': 'sa',
+    'is_locked': 'l',
+    'expires_at': 'x',
+    'error': 'e',
+}
+FIELD_NAMES = {code: name for name, code in FIELD_CODES.items()}
+
+
+class FrameError(ValueError):
+    pass
+
+
+def _pack(payload):
+    compact = {FIELD_CODES.get(key, key): value for key, value in payload.items()}
+    return msgpack.packb(compact, use_bin_type=True)
+
+
+def encode(payload, binary):
+    """Return send() kwargs for payload in the connection's format."""
+    if binary:
+        return {'bytes_data': _pack(payload)}
+    return {'text_data': json.dumps(payload)}
+
+
+def prepare(payload):
+    """Encode a group event once in every format, for channel-layer fan-out."""
+    return {'text': json.dumps(payload), 'bytes': _pack(payload)}
+
+
+def select(frames, binary):
+    if binary:
+        return {'bytes_data': frames['bytes']}
+    return {'text_data': frames['text']}
+
+
+def decode(text_data=None, bytes_data=None):
+    if bytes_data is not None:
+        try:
+            compact = msgpack.unpackb(bytes_data, raw=False)
+        except (msgpack.UnpackException, ValueError) as e:
+            raise FrameError(str(e))
+        if not isinstance(compact, dict):
+            raise FrameError('Frame must be a map')
+        return {FIELD_NAMES.get(key, key): value for key, value in compact.items()}
+    
+    try:
+        data = json.loads(text_data)
+    except (TypeError, json.JSONDecodeError) as e:
+        raise FrameError(str(e))
+    if not isinstance(data, dict):
+        raise FrameError('Frame must be an object')
+    return data
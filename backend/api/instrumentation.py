@@ -0,0 +1,119 @@
+import bisect
+import threading
+import time
+from django.conf import settings
+from django.db import connection
+
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+SIZE_BUCKETS = (0, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000, 500000)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        cumulative, running = [], 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            running += count
+            cumulative.append((bound, running))
+        return {'buckets': cumulative, 'sum': self.sum, 'count': self.count}
+
+
+class MetricsRegistry:
+    """Per-process histograms keyed by (metric name, stage label)."""
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, metric, stage, value, buckets):
+        with self._lock:
+            histogram = self._histograms.get((metric, stage))
+            if histogram is None:
+                histogram = self._histograms[(metric, stage)] = Histogram(buckets)
+            histogram.observe(value)
+
+    def stats(self):
+        grouped = {}
+        with self._lock:
+            for (metric, stage), histogram in self._histograms.items():
+                grouped.setdefault(f'{self.prefix}_{metric}', {})[stage] = histogram.snapshot()
+        return grouped
+
+    def render_prometheus(self):
+        lines = []
+        for name, stages in sorted(self.stats().items()):
+            lines.append(f'# TYPE {name} histogram')
+            for stage, snapshot in sorted(stages.items()):
+                for bound, count in snapshot['buckets']:
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {count}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {snapshot["sum"]}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {snapshot["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def size(self, value):
+        pass
+
+
+NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+        self.queries = 0
+
+    def _count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self._count_query)
+        self._wrapper.__enter__()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._started
+        self._wrapper.__exit__(*exc)
+        self.registry.observe('stage_seconds', self.name, elapsed, SECONDS_BUCKETS)
+        self.registry.observe('stage_queries', self.name, self.queries, QUERY_BUCKETS)
+        return False
+
+    def size(self, value):
+        self.registry.observe('stage_candidates', self.name, value, SIZE_BUCKETS)
+
+
+matching_metrics = MetricsRegistry('matching')
+
+
+def matching_stage(name):
+    """
+    Time a matching stage, counting its SQL queries; call .size(n) on the
+    result to record a candidate set size. A shared no-op when
+    MATCHING_METRICS_ENABLED is off.
+    """
+    if not settings.MATCHING_METRICS_ENABLED:
+        return NULL_STAGE
+    return _Stage(matching_metrics, name)
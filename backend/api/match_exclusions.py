@@ -0,0 +1,103 @@
+from django.db.models import Q
+from django.utils import timezone
+from .models import Match
+from .redis_client import get_redis
+from redis.exceptions import RedisError, WatchError
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Per-user sorted set of matched partner ids scored by the match's expires_at,
+# so expired matches drop out of range queries before cleanup deletes them.
+# LOADED marks a set that was fully built from the database.
+LOADED = ''
+KEY_TTL = 7 * 24 * 60 * 60
+
+def exclusion_key(user_id):
+    return f'match_exclusions:{user_id}'
+
+def _load_from_db(user_id, now):
+    partners = {}
+    rows = Match.objects.filter(
+        Q(user_a_id=user_id) | Q(user_b_id=user_id),
+        expires_at__gt=now,
+    ).values_list('user_a_id', 'user_b_id', 'expires_at')
+    
+    for a_id, b_id, expires_at in rows:
+        partner_id = b_id if a_id == user_id else a_id
+        partners[str(partner_id)] = max(partners.get(str(partner_id), 0), expires_at.timestamp())
+    return partners
+
+def _rebuild(r, key, user_id, now):
+    # WATCH before reading the database: an add_match for a match committed
+    # after that read touches the key and aborts the rewrite, rather than
+    # being overwritten by a set that lacks it.
+    with r.pipeline() as pipe:
+        pipe.watch(key)
+        partners = _load_from_db(user_id, now)
+        pipe.multi()
+        pipe.delete(key)
+        pipe.zadd(key, {**partners, LOADED: float('inf')})
+        pipe.expire(key, KEY_TTL)
+        try:
+            pipe.execute()
+        except WatchError:
+            pass
+    return partners
+
+def active_partner_ids(user_id):
+    now = timezone.now()
+    key = exclusion_key(user_id)
+    
+    try:
+        r = get_redis()
+        pipe = r.pipeline()
+        pipe.zremrangebyscore(key, '-inf', now.timestamp())
+        pipe.zscore(key, LOADED)
+        pipe.zrangebyscore(key, f'({now.timestamp()}', '+inf')
+        _, loaded, members = pipe.execute()
+        
+        if loaded is None:
+            members = _rebuild(r, key, user_id, now).keys()
+    except RedisError as e:
+        logger.warning(f"Match exclusion cache unavailable: {str(e)}")
+        members = _load_from_db(user_id, now).keys()
+    
+    return {int(member) for member in members if member != LOADED}
+
+def add_match(match):
+    expires = match.expires_at.timestamp()
+    keys = [exclusion_key(match.user_a_id), exclusion_key(match.user_b_id)]
+    try:
+        r = get_redis()
+        pipe = r.pipeline()
+        pipe.zadd(keys[0], {str(match.user_b_id): expires})
+        pipe.zadd(keys[1], {str(match.user_a_id): expires})
+        pipe.execute()
+    except RedisError as e:
+        # A set missing this match would let the pair be shown again; drop
+        # both so the next read rebuilds them from the database.
+        logger.warning(f"Failed to add match {match.id} to exclusion cache: {str(e)}")
+        try:
+            get_redis().delete(*keys)
+        except RedisError as e:
+            logger.error(f"Failed to invalidate exclusion cache for match {match.id}: {str(e)}")
+
+def remove_matches(pairs, batch_size=1000):
+    # Best effort: expired members already drop out by score, so a failure
+    # only leaves entries that the next read trims.
+    try:
+        r = get_redis()
+        pipe = r.pipeline()
+        pending = 0
+        for a_id, b_id in pairs:
+            pipe.zrem(exclusion_key(a_id), str(b_id))
+            pipe.zrem(exclusion_key(b_id), str(a_id))
+            pending += 1
+            if pending >= batch_size:
+                pipe.execute()
+                pending = 0
+        if pending:
+            pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Failed to remove expired matches from exclusion cache: {str(e)}")
@@ -1,11 +1,41 @@
-from django.db.models import Q, F
-from django.utils import timezone
-from .models import User, MatchProfile, Match, ChatRoom
-from datetime import timedelta
+from django.conf import settings
+from .models import Interest, User
+from .candidate_index import CandidateColumns, candidate_index, email_domain
+from .ann_index import ann_index
+from .instrumentation import matching_stage
+from . import match_exclusions
 import logging
+import random
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+SCORE_POOL_SIZE = 1000
+ANN_SCOPES = ('national', 'global')
+
+
+def interest_keys(users):
+    """(row << 32 | interest_id) for every interest of every user, with counts."""
+    interest_ids = [u.interest_ids[:Interest.MAX_PER_USER] for u in users]
+    counts = np.fromiter((len(ids) for ids in interest_ids), dtype=np.int64, count=len(users))
+    keys = np.fromiter(
+        ((row << 32) | interest_id for row, ids in enumerate(interest_ids) for interest_id in ids),
+        dtype=np.int64,
+        count=int(counts.sum()),
+    )
+    return keys, counts
+
+
+def seeded_keys(ids, seed):
+    """splitmix64 of id ^ seed: a stable pseudo-random sort key per candidate."""
+    with np.errstate(over='ignore'):
+        z = ids.astype(np.uint64) ^ np.uint64(seed)
+        z = z + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
 class MatchingEngine:
     def __init__(self):
         self.weights = {
@@ -16,79 +46,141 @@ class MatchingEngine:
             'education': 0.05,
         }
     
-    def find_candidates(self, user, limit=50):
+    def find_candidates(self, user, limit=50, offset=0, seed=None):
+        with matching_stage('find_candidates'):
+            return self.load_candidates(self.rank_candidates(user, limit, offset, seed))
+    
+    def rank_candidates(self, user, limit=50, offset=0, seed=None):
         profile = user.match_profile
         if not profile or not profile.is_active:
             return []
         
-        candidates = self._get_candidates_by_scope(user, profile)
-        candidates = self._apply_filters(candidates, user, profile)
-        candidates = self._apply_mode_filter(candidates, user, profile)
+        with matching_stage('index_build'):
+            candidate_index.ensure_built()
         
-        candidates = candidates[:limit]
-        return candidates
+        with matching_stage('scope') as stage:
+            candidates = self._get_candidates_by_scope(user, profile)
+            stage.size(len(candidates))
+        with matching_stage('filters') as stage:
+            candidates = self._apply_filters(candidates, user, profile)
+            stage.size(len(candidates))
+        with matching_stage('mode') as stage:
+            candidates = self._apply_mode_filter(candidates, user, profile)
+            stage.size(len(candidates))
+        
+        with matching_stage('sample') as stage:
+            pool = candidate_index.columns(self._sample(candidates, SCORE_POOL_SIZE, seed))
+            stage.size(len(pool))
+        if not pool:
+            return []
+        
+        with matching_stage('score'):
+            scores = self.score_batch(user, pool)
+            ranked = np.argsort(-scores, kind='stable')[offset:offset + limit]
+        return [(int(pool.id[i]), float(scores[i])) for i in ranked]
+    
+    def load_candidates(self, ranked):
+        scores_by_id = dict(ranked)
+        with matching_stage('load_users') as stage:
+            users = self._load_users([user_id for user_id, _ in ranked])
+            stage.size(len(users))
+        for candidate in users:
+            candidate.match_score = scores_by_id[candidate.id]
+        return users
+    
+    def _uses_ann(self, profile):
+        return getattr(settings, 'MATCHING_ANN_ENABLED', False) and profile.scope in ANN_SCOPES
     
     def _get_candidates_by_scope(self, user, profile):
-        base_query = User.objects.filter(
-            is_verified=True,
-            is_banned=False,
-            is_institutional=True,
-        ).exclude(id=user.id)
+        if self._uses_ann(profile):
+            candidates = ann_index.query(user, SCORE_POOL_SIZE * 4)
+            if profile.scope == 'national':
+                candidates = candidate_index.intersect_scope(candidates, 'country', user.country)
         
-        if profile.scope == 'same_institute':
-            user_domain = user.email.split('@')[1]
-            return base_query.filter(email__iendswith=f'@{user_domain}')
+        elif profile.scope == 'same_institute':
+            candidates = candidate_index.scope_ids('domain', email_domain(user.email))
         
         elif profile.scope == 'city':
-            return base_query.filter(city=user.city)
+            candidates = candidate_index.scope_ids('city', user.city)
         
         elif profile.scope == 'state':
-            return base_query.filter(state=user.state)
+            candidates = candidate_index.scope_ids('state', user.state)
         
         elif profile.scope == 'national':
-            return base_query.filter(country=user.country)
+            candidates = candidate_index.scope_ids('country', user.country)
         
         else:
-            return base_query
+            candidates = candidate_index.scope_ids()
+        
+        candidates.discard(user.id)
+        return candidates
     
     def _apply_filters(self, candidates, user, profile):
-        candidates = candidates.filter(
-            age__gte=profile.age_range_min,
-            age__lte=profile.age_range_max,
-        )
-        
-        if profile.height_range_min_cm and user.height_cm:
-            candidates = candidates.filter(
-                height_cm__gte=profile.height_range_min_cm,
-                height_cm__lte=profile.height_range_max_cm,
+        if self._uses_ann(profile):
+            candidates = candidate_index.restrict(
+                candidates,
+                profile.age_range_min,
+                profile.age_range_max,
+                profile.height_range_min_cm,
+                profile.height_range_max_cm,
+                check_height=bool(profile.height_range_min_cm and user.height_cm),
             )
+        else:
+            candidates &= candidate_index.age_ids(profile.age_range_min, profile.age_range_max)
+            
+            if profile.height_range_min_cm and user.height_cm:
+                candidates &= candidate_index.height_ids(
+                    profile.height_range_min_cm,
+                    profile.height_range_max_cm,
+                )
         
-        existing_matches = Match.objects.filter(
-            Q(user_a=user, expires_at__gt=timezone.now()) |
-            Q(user_b=user, expires_at__gt=timezone.now())
-        ).values_list('user_a_id', 'user_b_id')
-        
-        exclude_ids = set()
-        for a_id, b_id in existing_matches:
-            exclude_ids.add(a_id)
-            exclude_ids.add(b_id)
-        
-        candidates = candidates.exclude(id__in=exclude_ids)
+        with matching_stage('exclusions') as stage:
+            excluded = match_exclusions.active_partner_ids(user.id)
+            stage.size(len(excluded))
+        candidates -= excluded
         
-        return candidates.order_by('?')[:100]
+        return candidates
     
     def _apply_mode_filter(self, candidates, user, profile):
         if profile.preferred_mode == 'hookup':
             user_gender = user.gender
             if user_gender == 'M':
-                return candidates.filter(gender='F')
+                return candidate_index.intersect_gender(candidates, 'F')
             elif user_gender == 'F':
-                return candidates.filter(gender='M')
+                return candidate_index.intersect_gender(candidates, 'M')
             else:
                 return candidates
         
         return candidates
     
+    def _sample(self, candidates, limit, seed=None):
+        if seed is None:
+            if len(candidates) <= limit:
+                candidate_ids = list(candidates)
+                random.shuffle(candidate_ids)
+                return candidate_ids
+            return random.sample(list(candidates), limit)
+        
+        # Seeded sampling orders candidates by a hash of (id, seed) instead of
+        # shuffling, so the same seed yields the same pool and a user joining
+        # or leaving only adds or removes themselves rather than reshuffling.
+        ids = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        keys = seeded_keys(ids, seed)
+        if len(ids) > limit:
+            selected = np.argpartition(keys, limit)[:limit]
+        else:
+            selected = np.arange(len(ids))
+        selected = selected[np.argsort(keys[selected], kind='stable')]
+        return ids[selected].tolist()
+    
+    def _load_users(self, candidate_ids):
+        users = User.objects.filter(
+            id__in=candidate_ids,
+            is_verified=True,
+            is_banned=False,
+        ).in_bulk()
+        return [users[user_id] for user_id in candidate_ids if user_id in users]
+    
     def validate_mode(self, user_a, user_b, mode):
         if mode == 'friend':
             return True
@@ -123,18 +215,116 @@ class MatchingEngine:
         
         return min(100, max(0, total_score))
     
+    def score_batch(self, user, candidates):
+        """
+        Vectorised calculate_score(user, candidate) for every candidate.
+        
+        Takes a CandidateColumns snapshot from candidate_index.columns(),
+        whose features were encoded when the index was built or updated,
+        and returns a float64 array aligned with its rows; each value equals
+        the scalar score. Only the user is encoded here, once.
+        """
+        n = len(candidates)
+        if n == 0:
+            return np.zeros(0)
+        
+        features = CandidateColumns.of([user])
+        shared = np.isin(candidates.interests, features.interests[0])
+        interests = self._jaccard(shared.sum(axis=1), features.interest_count, candidates.interest_count)
+        
+        return self._combine(interests, features, candidates)
+    
+    def score_pairs(self, users_a, users_b):
+        """
+        Vectorised calculate_score(users_a[i], users_b[i]) for each i.
+        
+        Encodes both sides of every pair, so it is meant for match rescoring;
+        ranking one user against many candidates goes through score_batch.
+        """
+        n = len(users_a)
+        if n == 0:
+            return np.zeros(0)
+        
+        interests = self._score_interests_batch(users_a, users_b)
+        return self._combine(interests, CandidateColumns.of(users_a), CandidateColumns.of(users_b))
+    
+    def _combine(self, interests, features_a, features_b):
+        # features_a may hold a single row; it broadcasts against features_b.
+        scores = {
+            'interests': interests,
+            'location': self._score_location_batch(features_a, features_b),
+            'age': self._score_distance_batch(features_a.age, features_b.age, (2, 5, 10, 15)),
+            'height': self._score_distance_batch(
+                features_a.height_cm, features_b.height_cm, (5, 10, 20, 30)
+            ),
+            'education': self._score_education_batch(features_a, features_b),
+        }
+        
+        total_score = np.zeros(len(interests))
+        for key in scores:
+            total_score = total_score + scores[key] * self.weights[key]
+        
+        return np.clip(total_score, 0, 100)
+    
+    def _score_interests_batch(self, users_a, users_b):
+        # Interest ids are sorted and distinct per user, so tagging each with
+        # its pair index turns every pair's overlap into one set intersection.
+        keys_a, counts_a = interest_keys(users_a)
+        keys_b, counts_b = interest_keys(users_b)
+        common = np.intersect1d(keys_a, keys_b, assume_unique=True)
+        intersection = np.bincount(common >> 32, minlength=len(users_a))
+        return self._jaccard(intersection, counts_a, counts_b)
+    
+    @staticmethod
+    def _jaccard(intersection, counts_a, counts_b):
+        union = counts_a + counts_b - intersection
+        with np.errstate(divide='ignore', invalid='ignore'):
+            jaccard = (intersection / union) * 100
+        return np.where((counts_a == 0) | (counts_b == 0), 50.0, jaccard)
+    
+    @staticmethod
+    def _matches(codes_a, codes_b):
+        return (codes_a == codes_b) & (codes_a != -1)
+    
+    def _score_location_batch(self, features_a, features_b):
+        def matches(field):
+            return self._matches(getattr(features_a, field), getattr(features_b, field))
+        
+        return np.select(
+            [matches('city'), matches('state'), matches('country')],
+            [100.0, 75.0, 50.0],
+            default=25.0,
+        )
+    
+    @staticmethod
+    def _score_distance_batch(values_a, values_b, thresholds):
+        diff = np.abs(values_a - values_b)
+        scores = np.select(
+            [diff <= t for t in thresholds],
+            [100.0, 80.0, 60.0, 40.0],
+            default=20.0,
+        )
+        return np.where((values_a == 0) | (values_b == 0), 50.0, scores)
+    
+    def _score_education_batch(self, features_a, features_b):
+        def matches(field):
+            return self._matches(getattr(features_a, field), getattr(features_b, field))
+        
+        return np.select(
+            [matches('degree'), matches('profession')],
+            [100.0, 80.0],
+            default=50.0,
+        )
+    
     def _score_interests(self, user_a, user_b):
-        interests_a = set(user_a.interests) if user_a.interests else set()
-        interests_b = set(user_b.interests) if user_b.interests else set()
+        ids_a = user_a.interest_ids
+        ids_b = user_b.interest_ids
         
-        if not interests_a or not interests_b:
+        if not ids_a or not ids_b:
             return 50
         
-        intersection = len(interests_a & interests_b)
-        union = len(interests_a | interests_b)
-        
-        if union == 0:
-            return 0
+        intersection = len(set(ids_a).intersection(ids_b))
+        union = len(ids_a) + len(ids_b) - intersection
         
         return (intersection / union) * 100
     
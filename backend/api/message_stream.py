@@ -0,0 +1,235 @@
+import os
+import socket
+import uuid
+from datetime import datetime
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from redis.exceptions import RedisError, ResponseError
+from .models import ChatMessage, ChatRoom, User
+from .redis_client import get_redis, get_async_redis
+from . import receipts, room_activity, unread
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Write-behind queue for WebSocket chat messages. The consumer assigns the
+# id and timestamp, XADDs the message and broadcasts straight away; the
+# persist_chat_messages task drains the stream through a consumer group and
+# acks entries only after they are committed. Redelivery after a crash is
+# harmless because inserts are keyed by the message id (ignore_conflicts).
+
+STREAM = 'chat:messages'
+DEAD_LETTER_STREAM = 'chat:messages:dead'
+DEAD_LETTER_MAXLEN = 10000
+GROUP = 'chat-persisters'
+CLAIM_IDLE_MS = 60 * 1000
+PENDING_TTL = 60 * 60
+
+MESSAGE_TYPES = frozenset(choice for choice, _ in ChatMessage.MESSAGE_TYPE_CHOICES)
+MEDIA_URL_MAX_LENGTH = ChatMessage._meta.get_field('media_url').max_length
+
+def validate(message_type, content, media_url):
+    """Error text for a message the table would reject, else None."""
+    if not isinstance(message_type, str) or message_type not in MESSAGE_TYPES:
+        return 'Invalid message type'
+    if not isinstance(content, str) or not isinstance(media_url, str):
+        return 'Invalid message'
+    if len(media_url) > MEDIA_URL_MAX_LENGTH:
+        return 'Media URL too long'
+    return None
+
+def pending_key(room_id):
+    return f'chat:pending:{room_id}'
+
+async def enqueue(message_id, room_id, sender_id, message_type, content, media_url, created_at):
+    # The pending hash lets seen receipts resolve a message's timestamp
+    # before the drain has inserted it.
+    pipe = get_async_redis().pipeline()
+    pipe.xadd(STREAM, {
+        'id': str(message_id),
+        'room_id': str(room_id),
+        'sender_id': str(sender_id),
+        'message_type': message_type,
+        'content': content,
+        'media_url': media_url,
+        'created_at': created_at.isoformat(),
+    })
+    pipe.hset(pending_key(room_id), str(message_id), created_at.isoformat())
+    pipe.expire(pending_key(room_id), PENDING_TTL)
+    await pipe.execute()
+
+async def pending_created_at(room_id, message_id):
+    value = await get_async_redis().hget(pending_key(room_id), str(message_id))
+    return datetime.fromisoformat(value) if value else None
+
+def _ensure_group(r):
+    try:
+        r.xgroup_create(STREAM, GROUP, id='0', mkstream=True)
+    except ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+def _consumer_name():
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+def _read_batch(r, consumer, batch_size, block_ms):
+    # Entries left pending by a crashed drainer are reclaimed first.
+    entries = list(r.xautoclaim(STREAM, GROUP, consumer, CLAIM_IDLE_MS, '0-0', count=batch_size)[1])
+    if len(entries) < batch_size:
+        response = r.xreadgroup(
+            GROUP, consumer, {STREAM: '>'}, count=batch_size - len(entries), block=block_ms
+        )
+        for _, stream_entries in response or []:
+            entries.extend(stream_entries)
+    return entries
+
+def _dead_letter(r, entry_id, fields, reason):
+    logger.error(f"Dropping chat stream entry {entry_id}: {reason}")
+    try:
+        r.xadd(
+            DEAD_LETTER_STREAM,
+            {**(fields or {}), 'entry_id': entry_id, 'reason': reason},
+            maxlen=DEAD_LETTER_MAXLEN,
+            approximate=True,
+        )
+    except RedisError as e:
+        logger.warning(f"Failed to dead-letter chat stream entry {entry_id}: {str(e)}")
+
+def _insert(r, messages, fields_by_id):
+    # One bulk insert; if the database rejects any row, fall back to row by
+    # row so only the bad rows are dead-lettered and the batch still acks.
+    try:
+        with transaction.atomic():
+            ChatMessage.objects.bulk_create(messages, ignore_conflicts=True)
+        return messages
+    except DatabaseError as e:
+        logger.warning(f"Bulk insert of {len(messages)} chat messages failed, retrying per row: {str(e)}")
+    
+    inserted = []
+    for message in messages:
+        try:
+            with transaction.atomic():
+                ChatMessage.objects.bulk_create([message], ignore_conflicts=True)
+            inserted.append(message)
+        except DatabaseError as e:
+            entry_id, fields = fields_by_id[message.id]
+            _dead_letter(r, entry_id, fields, str(e))
+    return inserted
+
+def _apply_watermarks(r, messages, room_users):
+    # Receipts may have been sent while these messages were only on the
+    # stream. Watermarks are read after the insert committed, so a receipt
+    # is either seen here or its own UPDATE runs after this commit.
+    rooms = sorted({m.room_id for m in messages}, key=str)
+    try:
+        pipe = r.pipeline()
+        for room_id in rooms:
+            pipe.zmscore(receipts.watermark_key(room_id), [str(user_id) for user_id in room_users[room_id]])
+        scores = pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Failed to read seen watermarks: {str(e)}")
+        return
+    
+    seen_at = timezone.now()
+    for room_id, room_scores in zip(rooms, scores):
+        for recipient_id, watermark in zip(room_users[room_id], room_scores):
+            if watermark is None:
+                continue
+            seen_ids = [
+                m.id for m in messages
+                if m.room_id == room_id and m.sender_id != recipient_id
+                and m.created_at.timestamp() <= watermark
+            ]
+            if not seen_ids:
+                continue
+            marked = ChatMessage.objects.filter(id__in=seen_ids, is_seen=False).update(
+                is_seen=True,
+                seen_at=seen_at,
+            )
+            if marked:
+                unread.messages_seen(room_id, recipient_id, marked)
+
+def _release_pending(r, entries):
+    try:
+        pipe = r.pipeline()
+        for _, fields in entries:
+            if fields and 'room_id' in fields and 'id' in fields:
+                pipe.hdel(pending_key(fields['room_id']), fields['id'])
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Failed to release pending chat messages: {str(e)}")
+
+def _persist(r, entries):
+    messages = []
+    fields_by_id = {}
+    for entry_id, fields in entries:
+        if not fields:
+            continue
+        try:
+            message = ChatMessage(
+                id=uuid.UUID(fields['id']),
+                room_id=uuid.UUID(fields['room_id']),
+                sender_id=int(fields['sender_id']),
+                message_type=fields['message_type'],
+                content=fields.get('content', ''),
+                media_url=fields.get('media_url', ''),
+                created_at=datetime.fromisoformat(fields['created_at']),
+            )
+        except (KeyError, ValueError) as e:
+            _dead_letter(r, entry_id, fields, f'malformed: {str(e)}')
+            continue
+        error = validate(message.message_type, message.content, message.media_url)
+        if error:
+            _dead_letter(r, entry_id, fields, error)
+            continue
+        messages.append(message)
+        fields_by_id[message.id] = (entry_id, fields)
+    
+    room_ids = {m.room_id for m in messages}
+    sender_ids = {m.sender_id for m in messages}
+    room_users = {
+        room_id: (user_a_id, user_b_id)
+        for room_id, user_a_id, user_b_id in ChatRoom.objects.filter(
+            id__in=room_ids
+        ).values_list('id', 'user_a_id', 'user_b_id')
+    }
+    existing_senders = set(User.objects.filter(id__in=sender_ids).values_list('id', flat=True))
+    messages = [
+        m for m in messages
+        if m.room_id in room_users and m.sender_id in existing_senders
+    ]
+    
+    if messages:
+        messages = _insert(r, messages, fields_by_id)
+        _apply_watermarks(r, messages, room_users)
+    _release_pending(r, entries)
+    
+    last_activity = {}
+    for message in messages:
+        current = last_activity.get(message.room_id)
+        if current is None or message.created_at > current:
+            last_activity[message.room_id] = message.created_at
+    room_activity.touch_rooms(last_activity)
+    
+    return len(messages)
+
+def drain(batch_size=500, block_ms=None, max_batches=100):
+    r = get_redis()
+    _ensure_group(r)
+    consumer = _consumer_name()
+    
+    persisted = 0
+    for _ in range(max_batches):
+        entries = _read_batch(r, consumer, batch_size, block_ms)
+        if not entries:
+            break
+        
+        persisted += _persist(r, entries)
+        
+        entry_ids = [entry_id for entry_id, _ in entries]
+        pipe = r.pipeline()
+        pipe.xack(STREAM, GROUP, *entry_ids)
+        pipe.xdel(STREAM, *entry_ids)
+        pipe.execute()
+    
+    return persisted
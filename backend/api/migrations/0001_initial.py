@@ -1,5 +1,9 @@
+import django.contrib.auth.models
+import django.contrib.auth.validators
+import django.core.validators
 from django.db import migrations, models
 import django.db.models.deletion
+import django.utils.timezone
 import uuid
 
 
@@ -7,170 +11,512 @@ class Migration(migrations.Migration):
 
     initial = True
 
-    dependencies = []
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
 
     operations = [
         migrations.CreateModel(
-            name='InstituteDomain',
+            name='ChatRoom',
             fields=[
-                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('domain', models.CharField(max_length=255, unique=True)),
-                ('verified', models.BooleanField(default=False)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
                 ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('is_locked', models.BooleanField(default=False)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('last_activity', models.DateTimeField(auto_now=True)),
             ],
+            options={
+                'ordering': ['-last_activity'],
+            },
         ),
         migrations.CreateModel(
-            name='User',
+            name='Gift',
             fields=[
-                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('user_uuid', models.UUIDField(default=uuid.uuid4, unique=True)),
-                ('email', models.EmailField(max_length=254, unique=True)),
-                ('anonymous_handle', models.CharField(max_length=50, unique=True)),
-                ('email_verified', models.BooleanField(default=False)),
-                ('institutional_verified', models.BooleanField(default=False)),
-                ('gender', models.CharField(choices=[('M', 'Male'), ('F', 'Female'), ('O', 'Other')], max_length=1)),
-                ('age', models.IntegerField(blank=True, null=True)),
-                ('height_cm', models.IntegerField(blank=True, null=True)),
-                ('bio', models.TextField(blank=True, max_length=500)),
-                ('profile_picture', models.ImageField(blank=True, null=True, upload_to='profiles/')),
-                ('degree_or_profession', models.CharField(blank=True, max_length=255)),
-                ('interests', models.JSONField(default=list)),
-                ('city', models.CharField(blank=True, max_length=100)),
-                ('state', models.CharField(blank=True, max_length=100)),
-                ('country', models.CharField(default='IN', max_length=2)),
-                ('scope', models.CharField(choices=[('same_institute', 'Same Institute'), ('city', 'City'), ('state', 'State'), ('national', 'National'), ('global', 'Global')], default='same_institute', max_length=20)),
-                ('preference_mode', models.CharField(choices=[('friend', 'Friend'), ('hookup', 'Hookup')], default='friend', max_length=10)),
-                ('age_preference_min', models.IntegerField(default=18)),
-                ('age_preference_max', models.IntegerField(default=35)),
-                ('height_preference_min', models.IntegerField(blank=True, null=True)),
-                ('height_preference_max', models.IntegerField(blank=True, null=True)),
-                ('tokens', models.IntegerField(default=200)),
-                ('active', models.BooleanField(default=True)),
-                ('last_active', models.DateTimeField(auto_now=True)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('description', models.TextField(blank=True)),
+                ('image_url', models.URLField()),
+                ('animation_url', models.URLField(blank=True)),
+                ('token_cost', models.PositiveIntegerField()),
+                ('is_active', models.BooleanField(default=True)),
                 ('created_at', models.DateTimeField(auto_now_add=True)),
-                ('institute_domain', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.institutedomain')),
             ],
+            options={
+                'ordering': ['token_cost'],
+            },
         ),
         migrations.CreateModel(
-            name='Block',
+            name='InstitutionDomain',
             fields=[
                 ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('blocked_at', models.DateTimeField(auto_now_add=True)),
-                ('blocked_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocked_by', to='api.user')),
-                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocks', to='api.user')),
+                ('domain', models.CharField(max_length=255, unique=True)),
+                ('institution_name', models.CharField(max_length=255)),
+                ('country', models.CharField(max_length=100)),
+                ('is_approved', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
             ],
-            options={'unique_together': {('user', 'blocked_user')}},
+            options={
+                'ordering': ['domain'],
+            },
         ),
         migrations.CreateModel(
-            name='Match',
+            name='User',
             fields=[
                 ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('match_uuid', models.UUIDField(default=uuid.uuid4, unique=True)),
-                ('match_mode', models.CharField(choices=[('friend', 'Friend'), ('hookup', 'Hookup')], max_length=10)),
-                ('match_score', models.FloatField(default=0.0)),
-                ('status', models.CharField(choices=[('active', 'Active'), ('expired', 'Expired'), ('rejected', 'Rejected')], default='active', max_length=20)),
+                ('password', models.CharField(max_length=128, verbose_name='password')),
+                ('last_login', models.DateTimeField(blank=True, null=True, verbose_name='last login')),
+                ('is_superuser', models.BooleanField(default=False, help_text='Designates that this user has all permissions without explicitly assigning them.', verbose_name='superuser status')),
+                ('username', models.CharField(error_messages={'unique': 'A user with that username already exists.'}, help_text='Required. 150 characters or fewer. Letters, digits and @/./+/-/_ only.', max_length=150, unique=True, validators=[django.contrib.auth.validators.UnicodeUsernameValidator()], verbose_name='username')),
+                ('first_name', models.CharField(blank=True, max_length=150, verbose_name='first name')),
+                ('last_name', models.CharField(blank=True, max_length=150, verbose_name='last name')),
+                ('is_staff', models.BooleanField(default=False, help_text='Designates whether the user can log into this admin site.', verbose_name='staff status')),
+                ('is_active', models.BooleanField(default=True, help_text='Designates whether this user should be treated as active. Unselect this instead of deleting accounts.', verbose_name='active')),
+                ('date_joined', models.DateTimeField(default=django.utils.timezone.now, verbose_name='date joined')),
+                ('user_uuid', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('anonymous_handle', models.CharField(max_length=32, unique=True)),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('is_verified', models.BooleanField(default=False)),
+                ('is_institutional', models.BooleanField(default=False)),
+                ('verified_at', models.DateTimeField(blank=True, null=True)),
+                ('gender', models.CharField(blank=True, choices=[('M', 'Male'), ('F', 'Female'), ('NB', 'Non-Binary'), ('O', 'Other')], max_length=2)),
+                ('age', models.PositiveIntegerField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(18), django.core.validators.MaxValueValidator(100)])),
+                ('height_cm', models.PositiveIntegerField(blank=True, null=True)),
+                ('degree', models.CharField(blank=True, max_length=100)),
+                ('profession', models.CharField(blank=True, max_length=100)),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('state', models.CharField(blank=True, max_length=100)),
+                ('country', models.CharField(default='India', max_length=100)),
+                ('bio', models.TextField(blank=True, max_length=500)),
+                ('interests', models.JSONField(blank=True, default=list)),
+                ('photos', models.JSONField(blank=True, default=list)),
+                ('is_banned', models.BooleanField(default=False)),
+                ('banned_at', models.DateTimeField(blank=True, null=True)),
+                ('ban_reason', models.TextField(blank=True)),
+                ('tokens_balance', models.PositiveIntegerField(default=200)),
                 ('created_at', models.DateTimeField(auto_now_add=True)),
-                ('expires_at', models.DateTimeField()),
-                ('user1', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches_initiated', to='api.user')),
-                ('user2', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches_received', to='api.user')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('groups', models.ManyToManyField(blank=True, help_text='The groups this user belongs to. A user will get all permissions granted to each of their groups.', related_name='user_set', related_query_name='user', to='auth.group', verbose_name='groups')),
+                ('user_permissions', models.ManyToManyField(blank=True, help_text='Specific permissions for this user.', related_name='user_set', related_query_name='user', to='auth.permission', verbose_name='user permissions')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+            managers=[
+                ('objects', django.contrib.auth.models.UserManager()),
             ],
-            options={'unique_together': {('user1', 'user2')}},
         ),
         migrations.CreateModel(
-            name='ChatRoom',
+            name='TypingIndicator',
             fields=[
                 ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('room_uuid', models.UUIDField(default=uuid.uuid4, unique=True)),
-                ('status', models.CharField(choices=[('active', 'Active'), ('locked', 'Locked'), ('expired', 'Expired')], default='active', max_length=20)),
-                ('message_count', models.IntegerField(default=0)),
                 ('created_at', models.DateTimeField(auto_now_add=True)),
-                ('expires_at', models.DateTimeField()),
-                ('locked_at', models.DateTimeField(blank=True, null=True)),
-                ('match', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='chat_room', to='api.match')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='typing_indicators', to='api.chatroom')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.user')),
             ],
         ),
         migrations.CreateModel(
-            name='Message',
+            name='TokenTransaction',
             fields=[
-                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('message_uuid', models.UUIDField(default=uuid.uuid4, unique=True)),
-                ('message_type', models.CharField(choices=[('text', 'Text'), ('image', 'Image'), ('voice', 'Voice'), ('gift', 'Gift'), ('sticker', 'Sticker')], max_length=20)),
-                ('content', models.TextField(blank=True)),
-                ('media_url', models.URLField(blank=True)),
-                ('duration_seconds', models.IntegerField(blank=True, null=True)),
-                ('seen', models.BooleanField(default=False)),
-                ('seen_at', models.DateTimeField(blank=True, null=True)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('transaction_type', models.CharField(choices=[('gift', 'Gift Purchase'), ('sticker', 'Premium Sticker'), ('refund', 'Refund'), ('bonus', 'Bonus')], max_length=20)),
+                ('amount', models.IntegerField()),
+                ('balance_before', models.PositiveIntegerField()),
+                ('balance_after', models.PositiveIntegerField()),
+                ('description', models.TextField(blank=True)),
+                ('related_object_id', models.CharField(blank=True, max_length=255)),
                 ('created_at', models.DateTimeField(auto_now_add=True)),
-                ('chat_room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='api.chatroom')),
-                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='messages_sent', to='api.user')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='token_transactions', to='api.user')),
             ],
+            options={
+                'ordering': ['-created_at'],
+            },
         ),
         migrations.CreateModel(
             name='Subscription',
             fields=[
-                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('subscription_uuid', models.UUIDField(default=uuid.uuid4, unique=True)),
-                ('status', models.CharField(choices=[('active', 'Active'), ('expired', 'Expired'), ('cancelled', 'Cancelled')], default='active', max_length=20)),
-                ('price_inr', models.DecimalField(decimal_places=2, default=50, max_digits=10)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('payment_id', models.CharField(max_length=255, unique=True)),
+                ('amount_paise', models.PositiveIntegerField()),
+                ('currency', models.CharField(default='INR', max_length=3)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('success', 'Success'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], max_length=20)),
                 ('started_at', models.DateTimeField(auto_now_add=True)),
                 ('expires_at', models.DateTimeField()),
-                ('payment_id', models.CharField(blank=True, max_length=255)),
+                ('payment_method', models.CharField(blank=True, max_length=50)),
                 ('chat_room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to='api.chatroom')),
-                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to='api.user')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='subscription', to='api.user')),
             ],
+            options={
+                'ordering': ['-started_at'],
+            },
         ),
         migrations.CreateModel(
             name='Sticker',
             fields=[
-                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('sticker_uuid', models.UUIDField(default=uuid.uuid4, unique=True)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
                 ('name', models.CharField(max_length=100)),
+                ('description', models.TextField(blank=True)),
+                ('tier', models.CharField(choices=[('free', 'Free'), ('premium', 'Premium')], default='free', max_length=10)),
                 ('image_url', models.URLField()),
-                ('pack_name', models.CharField(max_length=100)),
-                ('premium', models.BooleanField(default=False)),
-                ('token_cost', models.IntegerField(default=0)),
+                ('thumbnail_url', models.URLField()),
+                ('token_cost', models.PositiveIntegerField(default=0)),
+                ('is_active', models.BooleanField(default=True)),
+                ('category', models.CharField(blank=True, max_length=50)),
+                ('tags', models.JSONField(blank=True, default=list)),
                 ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_stickers', to='api.user')),
             ],
+            options={
+                'ordering': ['tier', 'name'],
+            },
         ),
         migrations.CreateModel(
-            name='Gift',
+            name='SentGift',
             fields=[
-                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('gift_uuid', models.UUIDField(default=uuid.uuid4, unique=True)),
-                ('name', models.CharField(max_length=100)),
-                ('animation_url', models.URLField()),
-                ('premium', models.BooleanField(default=False)),
-                ('token_cost', models.IntegerField(default=10)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('message', models.CharField(blank=True, max_length=500)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('chat_room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sent_gifts', to='api.chatroom')),
+                ('gift', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sent_gifts', to='api.gift')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gifts_received', to='api.user')),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gifts_sent', to='api.user')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PaymentReminder',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('reminder_type', models.CharField(max_length=50)),
+                ('media_url', models.URLField(blank=True)),
                 ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('scheduled_at', models.DateTimeField()),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('chat_room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payment_reminders', to='api.chatroom')),
             ],
+            options={
+                'ordering': ['scheduled_at'],
+            },
         ),
         migrations.CreateModel(
             name='Notification',
             fields=[
-                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('notification_uuid', models.UUIDField(default=uuid.uuid4, unique=True)),
-                ('notification_type', models.CharField(choices=[('new_message', 'New Message'), ('match', 'Match'), ('payment_reminder', 'Payment Reminder'), ('chat_expiring', 'Chat Expiring'), ('chat_locked', 'Chat Locked')], max_length=30)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('notification_type', models.CharField(choices=[('match', 'Match'), ('message', 'New Message'), ('payment_reminder', 'Payment Reminder'), ('chat_expiring', 'Chat Expiring'), ('admin_alert', 'Admin Alert')], max_length=20)),
                 ('title', models.CharField(max_length=255)),
-                ('body', models.TextField(blank=True)),
-                ('image_url', models.URLField(blank=True)),
-                ('voice_url', models.URLField(blank=True)),
-                ('read', models.BooleanField(default=False)),
-                ('dismissible', models.BooleanField(default=True)),
+                ('body', models.TextField()),
+                ('related_room_id', models.UUIDField(blank=True, null=True)),
+                ('related_object_id', models.CharField(blank=True, max_length=255)),
+                ('is_read', models.BooleanField(default=False)),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('is_dismissed', models.BooleanField(default=False)),
+                ('dismissed_at', models.DateTimeField(blank=True, null=True)),
                 ('created_at', models.DateTimeField(auto_now_add=True)),
-                ('expires_at', models.DateTimeField(blank=True, null=True)),
                 ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='api.user')),
             ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MatchProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('preferred_mode', models.CharField(choices=[('friend', 'Friend'), ('hookup', 'Hookup')], default='friend', max_length=10)),
+                ('scope', models.CharField(choices=[('same_institute', 'Same Institute'), ('city', 'City'), ('state', 'State'), ('national', 'National'), ('global', 'Global')], default='global', max_length=20)),
+                ('age_range_min', models.PositiveIntegerField(default=18, validators=[django.core.validators.MinValueValidator(18)])),
+                ('age_range_max', models.PositiveIntegerField(default=60, validators=[django.core.validators.MaxValueValidator(100)])),
+                ('height_range_min_cm', models.PositiveIntegerField(blank=True, null=True)),
+                ('height_range_max_cm', models.PositiveIntegerField(blank=True, null=True)),
+                ('preferred_interests', models.JSONField(blank=True, default=list)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='match_profile', to='api.user')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Match',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('mode', models.CharField(choices=[('friend', 'Friend'), ('hookup', 'Hookup')], max_length=10)),
+                ('match_score', models.FloatField(validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)])),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('chat_room', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='match', to='api.chatroom')),
+                ('user_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches_as_a', to='api.user')),
+                ('user_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches_as_b', to='api.user')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
         ),
         migrations.CreateModel(
-            name='OtpToken',
+            name='InstitutionEmailList',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('emails', models.JSONField()),
+                ('file_name', models.CharField(max_length=255)),
+                ('uploaded_at', models.DateTimeField(auto_now_add=True)),
+                ('institution_domain', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='email_lists', to='api.institutiondomain')),
+                ('uploaded_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.user')),
+            ],
+            options={
+                'ordering': ['-uploaded_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='institutiondomain',
+            name='approved_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='approved_domains', to='api.user'),
+        ),
+        migrations.AddField(
+            model_name='gift',
+            name='created_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_gifts', to='api.user'),
+        ),
+        migrations.CreateModel(
+            name='EmailVerification',
             fields=[
                 ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('token', models.CharField(max_length=6, unique=True)),
                 ('email', models.EmailField(max_length=254)),
-                ('verified', models.BooleanField(default=False)),
-                ('attempts', models.IntegerField(default=0)),
+                ('otp', models.CharField(max_length=6)),
+                ('otp_attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=5)),
+                ('is_verified', models.BooleanField(default=False)),
                 ('created_at', models.DateTimeField(auto_now_add=True)),
                 ('expires_at', models.DateTimeField()),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='email_verification', to='api.user')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='user_a',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_rooms_as_a', to='api.user'),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='user_b',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_rooms_as_b', to='api.user'),
+        ),
+        migrations.CreateModel(
+            name='ChatMessage',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('message_type', models.CharField(choices=[('text', 'Text'), ('image', 'Image'), ('voice', 'Voice'), ('sticker', 'Sticker'), ('gift', 'Gift')], max_length=10)),
+                ('content', models.TextField(blank=True)),
+                ('media_url', models.URLField(blank=True)),
+                ('is_seen', models.BooleanField(default=False)),
+                ('seen_at', models.DateTimeField(blank=True, null=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='api.chatroom')),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='messages_sent', to='api.user')),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AdminLog',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('action', models.CharField(choices=[('user_ban', 'User Ban'), ('user_unban', 'User Unban'), ('delete_user', 'Delete User'), ('delete_chat', 'Delete Chat'), ('extend_chat', 'Extend Chat'), ('approve_domain', 'Approve Domain'), ('upload_sticker', 'Upload Sticker'), ('upload_gift', 'Upload Gift'), ('upload_reminder', 'Upload Reminder'), ('resolve_report', 'Resolve Report')], max_length=50)),
+                ('details', models.JSONField(default=dict)),
+                ('reason', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('admin', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='admin_logs', to='api.user')),
+                ('target_user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='admin_actions_on', to='api.user')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AbuseReport',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('reason', models.TextField()),
+                ('evidence_urls', models.JSONField(blank=True, default=list)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('reviewed', 'Reviewed'), ('resolved', 'Resolved')], default='pending', max_length=20)),
+                ('admin_notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('reported_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='abuse_reports_against', to='api.user')),
+                ('reporter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='abuse_reports', to='api.user')),
+                ('reviewed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reviewed_abuse_reports', to='api.user')),
             ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['user_uuid'], name='api_user_user_uu_ef28bb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_verified'], name='api_user_is_veri_4dbd55_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_institutional'], name='api_user_is_inst_129286_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_banned'], name='api_user_is_bann_a5eb9d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['created_at'], name='api_user_created_f8e07b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='typingindicator',
+            index=models.Index(fields=['room', 'created_at'], name='api_typingi_room_id_4d0b64_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='typingindicator',
+            unique_together={('room', 'user')},
+        ),
+        migrations.AddIndex(
+            model_name='tokentransaction',
+            index=models.Index(fields=['user', 'created_at'], name='api_tokentr_user_id_4f9a66_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', 'chat_room'], name='api_subscri_user_id_718fbc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['status'], name='api_subscri_status_ef9a1d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['expires_at'], name='api_subscri_expires_d54ede_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sticker',
+            index=models.Index(fields=['tier', 'is_active'], name='api_sticker_tier_85b6ae_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sticker',
+            index=models.Index(fields=['category'], name='api_sticker_categor_b79ce9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sentgift',
+            index=models.Index(fields=['sender', 'recipient'], name='api_sentgif_sender__ad531d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sentgift',
+            index=models.Index(fields=['chat_room'], name='api_sentgif_chat_ro_007733_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentreminder',
+            index=models.Index(fields=['scheduled_at', 'sent_at'], name='api_payment_schedul_9f6823_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read'], name='api_notific_user_id_16328d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['notification_type'], name='api_notific_notific_574e18_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matchprofile',
+            index=models.Index(fields=['user', 'is_active'], name='api_matchpr_user_id_de98a3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matchprofile',
+            index=models.Index(fields=['preferred_mode'], name='api_matchpr_preferr_05a0cd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['user_a', 'user_b'], name='api_match_user_a__28beea_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['created_at'], name='api_match_created_e13794_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['chat_room'], name='api_match_chat_ro_0f1f32_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='match',
+            unique_together={('user_a', 'user_b')},
+        ),
+        migrations.AddIndex(
+            model_name='institutiondomain',
+            index=models.Index(fields=['domain'], name='api_institu_domain_fcf566_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='institutiondomain',
+            index=models.Index(fields=['is_approved'], name='api_institu_is_appr_494336_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gift',
+            index=models.Index(fields=['is_active'], name='api_gift_is_acti_48e02c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emailverification',
+            index=models.Index(fields=['email'], name='api_emailve_email_5ee7fa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emailverification',
+            index=models.Index(fields=['is_verified'], name='api_emailve_is_veri_fffbf0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatroom',
+            index=models.Index(fields=['id'], name='api_chatroo_id_a291b7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatroom',
+            index=models.Index(fields=['user_a', 'user_b'], name='api_chatroo_user_a__a5b5eb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatroom',
+            index=models.Index(fields=['expires_at'], name='api_chatroo_expires_e40d13_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatroom',
+            index=models.Index(fields=['is_locked'], name='api_chatroo_is_lock_bf9671_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='chatroom',
+            unique_together={('user_a', 'user_b')},
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['room', 'created_at'], name='api_chatmes_room_id_b4d79b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['sender'], name='api_chatmes_sender__7c187d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['is_seen'], name='api_chatmes_is_seen_60f6a9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='adminlog',
+            index=models.Index(fields=['admin', 'created_at'], name='api_adminlo_admin_i_0c18f0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='adminlog',
+            index=models.Index(fields=['action'], name='api_adminlo_action_f9cd9f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='abusereport',
+            index=models.Index(fields=['status'], name='api_abusere_status_9a130f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='abusereport',
+            index=models.Index(fields=['reported_user'], name='api_abusere_reporte_c59590_idx'),
         ),
     ]
@@ -0,0 +1,55 @@
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+# Interest.MAX_NAME_LENGTH and Interest.MAX_PER_USER when this was written.
+MAX_NAME_LENGTH = 50
+MAX_PER_USER = 30
+
+
+def backfill_interest_ids(apps, schema_editor):
+    Interest = apps.get_model('api', 'Interest')
+    User = apps.get_model('api', 'User')
+    ids = {}
+
+    def intern(names):
+        names = [
+            name for name in dict.fromkeys(str(name).strip() for name in names or ())
+            if name and len(name) <= MAX_NAME_LENGTH
+        ][:MAX_PER_USER]
+        for name in names:
+            if name not in ids:
+                ids[name] = Interest.objects.get_or_create(name=name)[0].id
+        return sorted(ids[name] for name in names)
+
+    for user in User.objects.exclude(interests=[]).only('id', 'interests').iterator(chunk_size=1000):
+        User.objects.filter(id=user.id).update(interest_ids=intern(user.interests))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Interest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={'ordering': ['name']},
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='interest_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.PositiveIntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['interest_ids'], name='api_user_interest_ids_gin'),
+        ),
+        migrations.RunPython(backfill_interest_ids, migrations.RunPython.noop),
+    ]
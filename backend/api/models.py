@@ -1,10 +1,48 @@
 import uuid
 from django.db import models
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 import secrets
 
+class InterestManager(models.Manager):
+    def intern(self, names):
+        # Returns sorted, distinct ids. They are only identities (matching
+        # compares the sorted arrays), so gaps in the sequence cost nothing.
+        # The serializers reject oversized input; anything else that slips
+        # through is trimmed here rather than interned as a new row.
+        names = [
+            name for name in dict.fromkeys(str(name).strip() for name in names or ())
+            if name and len(name) <= Interest.MAX_NAME_LENGTH
+        ][:Interest.MAX_PER_USER]
+        if not names:
+            return []
+        
+        ids = dict(self.filter(name__in=names).values_list('name', 'id'))
+        missing = [name for name in names if name not in ids]
+        if missing:
+            self.bulk_create([Interest(name=name) for name in missing], ignore_conflicts=True)
+            ids.update(self.filter(name__in=missing).values_list('name', 'id'))
+        
+        return sorted(ids[name] for name in names)
+
+class Interest(models.Model):
+    MAX_NAME_LENGTH = 50
+    MAX_PER_USER = 30
+    
+    name = models.CharField(max_length=255, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = InterestManager()
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
 class User(AbstractUser):
     GENDER_CHOICES = [
         ('M', 'Male'),
@@ -34,6 +72,7 @@ class User(AbstractUser):
     
     bio = models.TextField(blank=True, max_length=500)
     interests = models.JSONField(default=list, blank=True)
+    interest_ids = ArrayField(models.PositiveIntegerField(), default=list, blank=True)
     photos = models.JSONField(default=list, blank=True)
     
     is_banned = models.BooleanField(default=False)
@@ -52,10 +91,19 @@ class User(AbstractUser):
             models.Index(fields=['is_institutional']),
             models.Index(fields=['is_banned']),
             models.Index(fields=['created_at']),
+            GinIndex(fields=['interest_ids'], name='api_user_interest_ids_gin'),
         ]
     
     def __str__(self):
         return self.anonymous_handle
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'interests' in update_fields:
+            self.interest_ids = Interest.objects.intern(self.interests)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'interest_ids'}
+        super().save(*args, **kwargs)
 
 class EmailVerification(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='email_verification')
@@ -230,7 +278,9 @@ class ChatMessage(models.Model):
     is_deleted = models.BooleanField(default=False)
     deleted_at = models.DateTimeField(null=True, blank=True)
     
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: write-behind inserts keep the timestamp the
+    # consumer broadcast.
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         ordering = ['created_at']
@@ -0,0 +1,17 @@
+from django.conf import settings
+from .redis_client import get_async_redis
+
+# Typing state lives only in Redis, as one key per (room, user) that expires
+# on its own, so a client that vanishes mid-word needs no sweep.
+
+def typing_key(room_id, user_id):
+    return f'typing:{room_id}:{user_id}'
+
+async def set_typing(room_id, user_id):
+    await get_async_redis().set(typing_key(room_id, user_id), 1, ex=settings.TYPING_INDICATOR_TTL)
+
+async def clear_typing(room_id, user_id):
+    await get_async_redis().delete(typing_key(room_id, user_id))
+
+async def is_typing(room_id, user_id):
+    return bool(await get_async_redis().exists(typing_key(room_id, user_id)))
@@ -0,0 +1,107 @@
+import time
+from django.conf import settings
+from .redis_client import get_async_redis
+from redis.exceptions import RedisError
+import logging
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600}
+PRUNE_EVERY = 1000
+
+
+def parse_rate(rate):
+    """'2/s', '30/m' or '100/h' -> tokens per second."""
+    num, period = rate.split('/')
+    return int(num) / PERIODS[period[0]]
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated_at')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def consume(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def is_full(self):
+        return self.tokens + (time.monotonic() - self.updated_at) * self.rate >= self.capacity
+
+
+def _new_bucket(event):
+    return TokenBucket(parse_rate(settings.WS_RATE_LIMITS[event]), settings.WS_RATE_BURST)
+
+
+class WebSocketRateLimiter:
+    """
+    Token buckets per connection and per user for inbound WebSocket events.
+
+    The per-user buckets are shared by every connection of that user in this
+    process, so opening more tabs does not raise the allowance. With
+    WS_GLOBAL_MESSAGE_RATE set, messages are also counted per user in Redis
+    across all processes (fixed one-minute windows).
+    """
+
+    def __init__(self):
+        self._users = {}
+        self._operations = 0
+
+    def connection_buckets(self):
+        return {event: _new_bucket(event) for event in settings.WS_RATE_LIMITS}
+
+    async def allow(self, user_id, event, connection_buckets):
+        bucket = connection_buckets.get(event)
+        if bucket is None:
+            return True
+        if not bucket.consume():
+            return False
+
+        user_buckets = self._users.get(user_id)
+        if user_buckets is None:
+            user_buckets = self._users[user_id] = {}
+        user_bucket = user_buckets.get(event)
+        if user_bucket is None:
+            user_bucket = user_buckets[event] = _new_bucket(event)
+        if not user_bucket.consume():
+            return False
+
+        self._operations += 1
+        if self._operations % PRUNE_EVERY == 0:
+            self._prune()
+
+        if event == 'message' and settings.WS_GLOBAL_MESSAGE_RATE:
+            return await self._allow_global(user_id)
+        return True
+
+    async def _allow_global(self, user_id):
+        window = int(time.time() // 60)
+        key = f'ws_rate:{user_id}:{window}'
+        try:
+            pipe = get_async_redis().pipeline()
+            pipe.incr(key)
+            pipe.expire(key, 120)
+            count, _ = await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Global WebSocket rate limit unavailable: {str(e)}")
+            return True
+        return count <= settings.WS_GLOBAL_MESSAGE_RATE
+
+    def _prune(self):
+        # Buckets that have refilled carry no state worth keeping.
+        for user_id in list(self._users):
+            buckets = self._users[user_id]
+            if all(bucket.is_full() for bucket in buckets.values()):
+                del self._users[user_id]
+
+
+ws_rate_limiter = WebSocketRateLimiter()
@@ -0,0 +1,17 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+def room_group_name(room_id):
+    return f'chat_{room_id}'
+
+async def _group_send_all(channel_layer, room_ids, event):
+    for room_id in room_ids:
+        await channel_layer.group_send(room_group_name(room_id), event)
+
+def broadcast_room_state(room_ids):
+    """Tell connected ChatConsumers to reload cached lock/access state."""
+    room_ids = list(room_ids)
+    channel_layer = get_channel_layer()
+    if channel_layer is None or not room_ids:
+        return
+    async_to_sync(_group_send_all)(channel_layer, room_ids, {'type': 'room_state'})
@@ -0,0 +1,18 @@
+from .redis_client import get_async_redis
+
+# Per-room sorted set of user id -> epoch seconds of the newest message the
+# user has seen. ZADD GT CH makes "advance if newer" a single atomic step, so
+# repeated or out-of-order receipts from several tabs cost no database work.
+
+WATERMARK_TTL = 30 * 24 * 60 * 60
+
+def watermark_key(room_id):
+    return f'seen_watermark:{room_id}'
+
+async def advance(room_id, user_id, seen_up_to):
+    key = watermark_key(room_id)
+    pipe = get_async_redis().pipeline()
+    pipe.zadd(key, {str(user_id): seen_up_to.timestamp()}, gt=True, ch=True)
+    pipe.expire(key, WATERMARK_TTL)
+    changed, _ = await pipe.execute()
+    return bool(changed)
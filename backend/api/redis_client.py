@@ -0,0 +1,22 @@
+import asyncio
+import weakref
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+_client = None
+_async_clients = weakref.WeakKeyDictionary()
+
+def get_redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _client
+
+def get_async_redis():
+    # asyncio clients are bound to the loop that created their connections.
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = aioredis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return client
@@ -0,0 +1,95 @@
+from datetime import datetime, timezone as dt_timezone
+from django.db import transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.db.models.functions import Greatest
+from .models import ChatRoom
+from .redis_client import get_redis
+from redis.exceptions import RedisError
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ChatRoom.last_activity bumps are coalesced in one sorted set (room id ->
+# epoch seconds, only ever raised) and written back by flush_room_activity
+# in a single UPDATE per chunk. Readers merge the pending value over the
+# column for the rooms they return, so shown activity is current and a
+# room's inbox position lags by at most one flush interval.
+
+PENDING_KEY = 'chat_room_activity'
+FLUSH_CHUNK_SIZE = 1000
+
+# Drop a member only if no newer bump landed while the flush was running.
+_RELEASE_SCRIPT = """
+for i = 1, #ARGV, 2 do
+    local score = redis.call('ZSCORE', KEYS[1], ARGV[i])
+    if score and tonumber(score) <= tonumber(ARGV[i + 1]) then
+        redis.call('ZREM', KEYS[1], ARGV[i])
+    end
+end
+return 0
+"""
+
+def _to_datetime(score):
+    return datetime.fromtimestamp(float(score), tz=dt_timezone.utc)
+
+def touch_rooms(activity):
+    """Record {room_id: datetime} bumps; falls back to direct UPDATEs."""
+    if not activity:
+        return
+    try:
+        get_redis().zadd(
+            PENDING_KEY,
+            {str(room_id): when.timestamp() for room_id, when in activity.items()},
+            gt=True,
+        )
+    except RedisError as e:
+        logger.warning(f"Failed to queue room activity, updating directly: {str(e)}")
+        for room_id, when in activity.items():
+            ChatRoom.objects.filter(id=room_id, last_activity__lt=when).update(last_activity=when)
+
+def touch_room(room_id, when):
+    touch_rooms({room_id: when})
+
+def pending_activity(room_ids):
+    room_ids = list(room_ids)
+    if not room_ids:
+        return {}
+    try:
+        scores = get_redis().zmscore(PENDING_KEY, [str(room_id) for room_id in room_ids])
+    except RedisError as e:
+        logger.warning(f"Failed to read pending room activity: {str(e)}")
+        return {}
+    return {
+        room_id: _to_datetime(score)
+        for room_id, score in zip(room_ids, scores)
+        if score is not None
+    }
+
+def flush():
+    r = get_redis()
+    pending = r.zrange(PENDING_KEY, 0, -1, withscores=True)
+    release = r.register_script(_RELEASE_SCRIPT)
+    
+    flushed = 0
+    for start in range(0, len(pending), FLUSH_CHUNK_SIZE):
+        chunk = pending[start:start + FLUSH_CHUNK_SIZE]
+        whens = [
+            When(id=room_id, then=Value(_to_datetime(score)))
+            for room_id, score in chunk
+        ]
+        with transaction.atomic():
+            flushed += ChatRoom.objects.filter(
+                id__in=[room_id for room_id, _ in chunk]
+            ).update(
+                last_activity=Greatest(
+                    'last_activity',
+                    Case(*whens, output_field=DateTimeField()),
+                )
+            )
+        
+        args = []
+        for room_id, score in chunk:
+            args.extend([room_id, repr(score)])
+        release(keys=[PENDING_KEY], args=args)
+    
+    return flushed
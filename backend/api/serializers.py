@@ -3,7 +3,7 @@ from django.contrib.auth import authenticate
 from django.utils import timezone
 from datetime import timedelta
 from .models import (
-    User, EmailVerification, InstitutionDomain, MatchProfile, Match, ChatRoom,
+    User, EmailVerification, InstitutionDomain, Interest, MatchProfile, Match, ChatRoom,
     ChatMessage, Notification, Sticker, Gift, SentGift, Subscription, TokenTransaction,
     AbuseReport, PaymentReminder
 )
@@ -100,8 +100,16 @@ class InstitutionDomainSerializer(serializers.ModelSerializer):
         model = InstitutionDomain
         fields = ['id', 'domain', 'institution_name', 'country', 'is_approved']
 
+def interest_list_field():
+    return serializers.ListField(
+        child=serializers.CharField(max_length=Interest.MAX_NAME_LENGTH),
+        max_length=Interest.MAX_PER_USER,
+        required=False,
+    )
+
 class UserProfileSerializer(serializers.ModelSerializer):
     match_profile = serializers.SerializerMethodField()
+    interests = interest_list_field()
     
     class Meta:
         model = User
@@ -119,6 +127,8 @@ class UserProfileSerializer(serializers.ModelSerializer):
             return None
 
 class MatchProfileSerializer(serializers.ModelSerializer):
+    preferred_interests = interest_list_field()
+    
     class Meta:
         model = MatchProfile
         fields = [
@@ -147,6 +157,17 @@ class ChatRoomSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at', 'expires_at', 'is_locked']
 
+class InboxRoomSerializer(ChatRoomSerializer):
+    last_message_preview = serializers.CharField(read_only=True)
+    last_message_type = serializers.CharField(read_only=True)
+    last_message_at = serializers.DateTimeField(read_only=True)
+    unread_count = serializers.IntegerField(read_only=True)
+    
+    class Meta(ChatRoomSerializer.Meta):
+        fields = ChatRoomSerializer.Meta.fields + [
+            'last_message_preview', 'last_message_type', 'last_message_at', 'unread_count'
+        ]
+
 class ChatMessageSerializer(serializers.ModelSerializer):
     sender_handle = serializers.CharField(source='sender.anonymous_handle', read_only=True)
     
@@ -1,6 +1,10 @@
-from django.db.models.signals import post_delete
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from .models import ChatRoom, Match
+from .models import ChatRoom, Match, MatchProfile, Notification, User
+from .candidate_index import candidate_index, INDEXED_USER_FIELDS
+from .tasks import queue_feed_refresh
+from . import unread
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,3 +16,33 @@ def cleanup_orphaned_chat_rooms(sender, instance, **kwargs):
             instance.chat_room.delete()
     except Exception as e:
         logger.error(f"Error cleaning up chat room: {str(e)}")
+
+@receiver(post_save, sender=User)
+def index_user(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not INDEXED_USER_FIELDS.intersection(update_fields):
+        return
+    transaction.on_commit(lambda: candidate_index.update_user(instance))
+    if instance.is_verified:
+        transaction.on_commit(lambda: queue_feed_refresh(instance.id))
+
+@receiver(post_delete, sender=User)
+def unindex_user(sender, instance, **kwargs):
+    user_id = instance.id
+    transaction.on_commit(lambda: candidate_index.remove_user(user_id))
+
+@receiver(post_save, sender=MatchProfile)
+def index_match_profile(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: queue_feed_refresh(user_id))
+    
+    if not candidate_index.is_built:
+        return
+    user = instance.user
+    is_active = instance.is_active
+    transaction.on_commit(lambda: candidate_index.set_profile_active(user, is_active))
+
+@receiver(post_save, sender=Notification)
+def count_unread_notification(sender, instance, created, **kwargs):
+    if created:
+        user_id = instance.user_id
+        transaction.on_commit(lambda: unread.notification_created(user_id))
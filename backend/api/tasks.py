@@ -1,13 +1,25 @@
-from celery import shared_task
+from celery import shared_task, group
 from django.utils import timezone
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
 from django.core.mail import send_mail
 from django.conf import settings
 from datetime import timedelta
+from kombu.exceptions import OperationalError as BrokerError
+from redis.exceptions import RedisError
 from .models import (
-    ChatRoom, Notification, PaymentReminder, User, Subscription,
-    EmailVerification, Match
+    ChatRoom, ChatMessage, Notification, PaymentReminder, User, Subscription,
+    EmailVerification, Match, MatchProfile
 )
+from .batch_delete import delete_in_batches
+from .matching import MatchingEngine
+from .redis_client import get_redis
+from .realtime import broadcast_room_state
+from . import chat_expiry, feed, match_exclusions, message_stream, room_activity, unread
+import hashlib
+import json
 import logging
+import uuid
 
 logger = logging.getLogger(__name__)
 
@@ -27,75 +39,159 @@ def send_otp_email(email, otp):
         return False
     return True
 
+NOTIFICATION_BATCH_SIZE = 1000
+
+def _notify_rooms(rooms, notification_type, title, body):
+    # rooms yields (room_id, user_a_id, user_b_id); both participants are
+    # notified with chunked bulk inserts and one unread-counter round trip
+    # per chunk once the surrounding transaction commits.
+    count = 0
+    batch = []
+    
+    def flush():
+        Notification.objects.bulk_create(batch)
+        user_ids = [notification.user_id for notification in batch]
+        transaction.on_commit(lambda: unread.notifications_created(user_ids))
+    
+    for room_id, user_a_id, user_b_id in rooms:
+        for user_id in (user_a_id, user_b_id):
+            batch.append(Notification(
+                user_id=user_id,
+                notification_type=notification_type,
+                title=title,
+                body=body,
+                related_room_id=room_id,
+            ))
+        count += 1
+        if len(batch) >= NOTIFICATION_BATCH_SIZE:
+            flush()
+            batch = []
+    
+    if batch:
+        flush()
+    return count
+
+EXPIRE_CHATS_SQL = '''
+    UPDATE {table} SET is_locked = TRUE, locked_at = %s
+    WHERE id IN (
+        SELECT id FROM {table}
+        WHERE expires_at <= %s AND is_locked = FALSE AND is_deleted = FALSE
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, user_a_id, user_b_id
+'''
+
+EXPIRE_DUE_CHATS_SQL = '''
+    UPDATE {table} SET is_locked = TRUE, locked_at = %s
+    WHERE id = ANY(%s::uuid[]) AND expires_at <= %s AND is_locked = FALSE AND is_deleted = FALSE
+    RETURNING id, user_a_id, user_b_id
+'''
+EXPIRY_SCHEDULE_AHEAD = timedelta(hours=2)
+
+def _lock_expired_chats(sql, params):
+    # Locks and returns rooms with one UPDATE ... RETURNING, then notifies.
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        if rows:
+            _notify_rooms(
+                rows,
+                notification_type='chat_expiring',
+                title='Chat Room Expired',
+                body='Your chat room has expired. Pay to continue.',
+            )
+    
+    broadcast_room_state(room_id for room_id, _, _ in rows)
+    return len(rows)
+
+@shared_task
+def expire_due_chats():
+    now = timezone.now()
+    sql = EXPIRE_DUE_CHATS_SQL.format(table=connection.ops.quote_name(ChatRoom._meta.db_table))
+    locked = 0
+    
+    # Rooms rescheduled or unlocked by other means are skipped by the
+    # UPDATE's own conditions and simply released from the schedule.
+    while True:
+        room_ids = chat_expiry.due(now, NOTIFICATION_BATCH_SIZE // 2)
+        if not room_ids:
+            break
+        locked += _lock_expired_chats(sql, [now, room_ids, now])
+        chat_expiry.release(room_ids, now)
+    
+    if locked:
+        logger.info(f"Expired {locked} due chat rooms")
+    return locked
+
 @shared_task
 def expire_chats():
     now = timezone.now()
-    expired_chats = ChatRoom.objects.filter(
-        expires_at__lte=now,
-        is_locked=False,
-        is_deleted=False
-    )
+    sql = EXPIRE_CHATS_SQL.format(table=connection.ops.quote_name(ChatRoom._meta.db_table))
+    locked = 0
     
-    for chat in expired_chats:
-        chat.is_locked = True
-        chat.locked_at = now
-        chat.save(update_fields=['is_locked', 'locked_at'])
-        
-        Notification.objects.create(
-            user=chat.user_a,
-            notification_type='chat_expiring',
-            title='Chat Room Expired',
-            body='Your chat room has expired. Pay to continue.',
-            related_room_id=str(chat.id),
-        )
-        Notification.objects.create(
-            user=chat.user_b,
-            notification_type='chat_expiring',
-            title='Chat Room Expired',
-            body='Your chat room has expired. Pay to continue.',
-            related_room_id=str(chat.id),
-        )
+    # Safety sweep behind expire_due_chats: locks anything the schedule
+    # missed and re-adds rooms expiring before the next sweep.
+    while True:
+        chunk = _lock_expired_chats(sql, [now, now, NOTIFICATION_BATCH_SIZE // 2])
+        if not chunk:
+            break
+        locked += chunk
+    
+    upcoming = ChatRoom.objects.filter(
+        expires_at__gt=now,
+        expires_at__lte=now + EXPIRY_SCHEDULE_AHEAD,
+        is_locked=False,
+        is_deleted=False,
+    ).values_list('id', 'expires_at')
+    chat_expiry.schedule(upcoming.iterator(chunk_size=NOTIFICATION_BATCH_SIZE))
     
-    logger.info(f"Expired {expired_chats.count()} chat rooms")
+    logger.info(f"Expired {locked} chat rooms")
+    return locked
 
 @shared_task
 def send_payment_reminders():
     now = timezone.now()
     five_days_from_now = now + timedelta(days=5)
-    seven_days_from_now = now + timedelta(days=7)
     
+    already_reminded = Notification.objects.filter(
+        notification_type='payment_reminder',
+        related_room_id=OuterRef('pk'),
+    )
     day_five_chats = ChatRoom.objects.filter(
         expires_at__lte=five_days_from_now,
         expires_at__gt=now,
         is_locked=False,
         is_deleted=False
-    ).exclude(notifications__notification_type='payment_reminder')
-    
-    for chat in day_five_chats:
-        Notification.objects.create(
-            user=chat.user_a,
-            notification_type='payment_reminder',
-            title='Chat Expiring Soon',
-            body='Your chat will expire in 2 days. Pay now to keep chatting.',
-            related_room_id=str(chat.id),
-        )
-        Notification.objects.create(
-            user=chat.user_b,
-            notification_type='payment_reminder',
-            title='Chat Expiring Soon',
-            body='Your chat will expire in 2 days. Pay now to keep chatting.',
-            related_room_id=str(chat.id),
-        )
+    ).exclude(Exists(already_reminded)).values_list('id', 'user_a_id', 'user_b_id')
+    
+    # One short transaction per chunk; reminded rooms drop out of the
+    # Exists() exclusion, so each query picks up the next chunk.
+    count = 0
+    while True:
+        rooms = list(day_five_chats[:NOTIFICATION_BATCH_SIZE // 2])
+        if not rooms:
+            break
+        with transaction.atomic():
+            count += _notify_rooms(
+                rooms,
+                notification_type='payment_reminder',
+                title='Chat Expiring Soon',
+                body='Your chat will expire in 2 days. Pay now to keep chatting.',
+            )
+        if len(rooms) < NOTIFICATION_BATCH_SIZE // 2:
+            break
     
-    logger.info(f"Sent payment reminders for {day_five_chats.count()} chats")
+    logger.info(f"Sent payment reminders for {count} chats")
+    return count
 
 @shared_task
 def cleanup_expired_otps():
     now = timezone.now()
     expired = EmailVerification.objects.filter(expires_at__lt=now, is_verified=False)
-    count = expired.count()
-    expired.delete()
-    logger.info(f"Cleaned up {count} expired OTPs")
+    # Nothing references EmailVerification rows, so plain DELETEs are safe.
+    return delete_in_batches(expired, 'cleanup_expired_otps', raw=True)
 
 @shared_task
 def cleanup_unverified_users():
@@ -104,17 +200,36 @@ def cleanup_unverified_users():
         is_verified=False,
         created_at__lt=week_ago
     )
-    count = unverified.count()
-    unverified.delete()
-    logger.info(f"Cleaned up {count} unverified users")
+    return delete_in_batches(unverified, 'cleanup_unverified_users')
+
+def _delete_room_messages(rows):
+    # Messages are the bulk of a room's rows and have no dependents, so
+    # they go first with plain DELETEs instead of through the collector.
+    messages = ChatMessage.objects.filter(room_id__in=[row[0] for row in rows])
+    delete_in_batches(messages, 'cleanup_room_messages', raw=True, pause=0)
+
+def _delete_match_rooms(rows):
+    # Each room belongs to one match, so the chunk's rooms are deleted here,
+    # messages first, rather than by the per-Match post_delete signal; the
+    # matches then reach the signal with chat_room already cleared.
+    room_ids = [chat_room_id for _, _, _, chat_room_id in rows if chat_room_id is not None]
+    if room_ids:
+        rooms = ChatRoom.objects.filter(id__in=room_ids)
+        delete_in_batches(rooms, 'cleanup_expired_matches.rooms', before_delete=_delete_room_messages, pause=0)
 
 @shared_task
 def cleanup_expired_matches():
     now = timezone.now()
     expired = Match.objects.filter(expires_at__lt=now)
-    count = expired.count()
-    expired.delete()
-    logger.info(f"Cleaned up {count} expired matches")
+    return delete_in_batches(
+        expired,
+        'cleanup_expired_matches',
+        fields=('user_a_id', 'user_b_id', 'chat_room_id'),
+        before_delete=_delete_match_rooms,
+        after_delete=lambda rows: match_exclusions.remove_matches(
+            [(user_a_id, user_b_id) for _, user_a_id, user_b_id, _ in rows]
+        ),
+    )
 
 @shared_task
 def cleanup_deleted_chats():
@@ -123,39 +238,46 @@ def cleanup_deleted_chats():
         is_deleted=True,
         deleted_at__lt=thirty_days_ago
     )
-    count = deleted.count()
-    deleted.delete()
-    logger.info(f"Cleaned up {count} deleted chat rooms")
+    return delete_in_batches(deleted, 'cleanup_deleted_chats', before_delete=_delete_room_messages)
+
+EXPIRE_SUBSCRIPTIONS_SQL = '''
+    UPDATE {table} SET status = 'expired'
+    WHERE id IN (
+        SELECT id FROM {table}
+        WHERE status = 'success' AND expires_at < %s
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING chat_room_id
+'''
+SUBSCRIPTION_BATCH_SIZE = 1000
 
 @shared_task
 def verify_subscriptions():
     now = timezone.now()
-    expired_subs = Subscription.objects.filter(
-        status='success',
-        expires_at__lt=now
-    )
+    sql = EXPIRE_SUBSCRIPTIONS_SQL.format(table=connection.ops.quote_name(Subscription._meta.db_table))
+    expired = 0
     
-    for sub in expired_subs:
-        sub.status = 'expired'
-        sub.save(update_fields=['status'])
+    # Per chunk: one UPDATE expires the subscriptions, a second locks their
+    # rooms, both in one transaction.
+    while True:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [now, SUBSCRIPTION_BATCH_SIZE])
+                rows = cursor.fetchall()
+            if not rows:
+                break
+            room_ids = {room_id for room_id, in rows}
+            ChatRoom.objects.filter(id__in=room_ids, is_locked=False).update(
+                is_locked=True,
+                locked_at=now,
+            )
         
-        chat = sub.chat_room
-        if not chat.is_locked:
-            chat.is_locked = True
-            chat.locked_at = now
-            chat.save(update_fields=['is_locked', 'locked_at'])
+        broadcast_room_state(room_ids)
+        expired += len(rows)
     
-    logger.info(f"Verified {expired_subs.count()} subscriptions")
-
-@shared_task
-def cleanup_typing_indicators():
-    five_minutes_ago = timezone.now() - timedelta(minutes=5)
-    old_indicators = models.TypingIndicator.objects.filter(
-        created_at__lt=five_minutes_ago
-    )
-    count = old_indicators.count()
-    old_indicators.delete()
-    logger.info(f"Cleaned up {count} stale typing indicators")
+    logger.info(f"Verified {expired} subscriptions")
+    return expired
 
 @shared_task
 def retry_failed_emails(max_retries=3):
@@ -170,3 +292,172 @@ def retry_failed_emails(max_retries=3):
     for log in pending:
         log.details['retry_count'] = log.details.get('retry_count', 0) + 1
         log.save(update_fields=['details'])
+
+@shared_task
+def persist_chat_messages():
+    persisted = message_stream.drain(batch_size=settings.CHAT_WRITE_BEHIND_BATCH_SIZE)
+    if persisted:
+        logger.info(f"Persisted {persisted} write-behind chat messages")
+    return persisted
+
+@shared_task
+def flush_room_activity():
+    flushed = room_activity.flush()
+    if flushed:
+        logger.info(f"Flushed last_activity for {flushed} chat rooms")
+    return flushed
+
+@shared_task
+def reconcile_unread_counters():
+    rewritten = unread.reconcile()
+    logger.info(f"Reconciled unread counters for {rewritten} users")
+    return rewritten
+
+def feed_refresh_key(user_id):
+    return f'match_feed_refresh:{user_id}'
+
+def queue_feed_refresh(user_id):
+    # At most one queued refresh per user: the marker is set here and cleared
+    # when the task starts, so feed misses and saves while it waits add
+    # nothing. Redis is also the broker, so an outage is logged, not raised.
+    key = feed_refresh_key(user_id)
+    try:
+        r = get_redis()
+        if not r.set(key, 1, nx=True, ex=settings.MATCHING_FEED_REFRESH_DEBOUNCE):
+            return
+        try:
+            refresh_match_feed.delay(user_id)
+        except BrokerError:
+            r.delete(key)
+            raise
+    except (BrokerError, RedisError) as e:
+        logger.warning(f"Failed to queue match feed refresh for user {user_id}: {str(e)}")
+
+@shared_task
+def refresh_match_feed(user_id):
+    get_redis().delete(feed_refresh_key(user_id))
+    try:
+        user = User.objects.select_related('match_profile').get(id=user_id)
+        profile = user.match_profile
+    except (User.DoesNotExist, MatchProfile.DoesNotExist):
+        feed.invalidate_feed(user_id)
+        return 0
+    
+    if not profile.is_active or not user.is_verified or user.is_banned:
+        feed.invalidate_feed(user_id)
+        return 0
+    
+    ranked = MatchingEngine().rank_candidates(user, limit=settings.MATCHING_FEED_SIZE)
+    feed.write_feed(user_id, ranked)
+    return len(ranked)
+
+@shared_task
+def refresh_match_feeds():
+    engine = MatchingEngine()
+    users = User.objects.filter(
+        is_verified=True,
+        is_banned=False,
+        match_profile__is_active=True,
+    ).select_related('match_profile').iterator(chunk_size=500)
+    
+    count = 0
+    for user in users:
+        try:
+            ranked = engine.rank_candidates(user, limit=settings.MATCHING_FEED_SIZE)
+            feed.write_feed(user.id, ranked)
+            count += 1
+        except Exception as e:
+            logger.error(f"Failed to refresh match feed for user {user.id}: {str(e)}")
+    
+    logger.info(f"Refreshed match feeds for {count} users")
+
+RESCORE_CHECKPOINT_TTL = 7 * 24 * 60 * 60
+SCORING_USER_FIELDS = [
+    'id', 'interest_ids', 'city', 'state', 'country', 'age', 'height_cm', 'degree', 'profession',
+]
+
+def _rescore_run_id(engine):
+    weights = json.dumps(engine.weights, sort_keys=True).encode()
+    return f"v{Match.SCORE_ALGORITHM_VERSION}-{hashlib.sha1(weights).hexdigest()[:8]}"
+
+def _shard_bounds(shard, shards):
+    span = (1 << 128) // shards
+    low = uuid.UUID(int=shard * span)
+    high = uuid.UUID(int=(shard + 1) * span) if shard < shards - 1 else None
+    return low, high
+
+def _rescore_chunk(engine, matches):
+    user_ids = {m.user_a_id for m in matches} | {m.user_b_id for m in matches}
+    users = User.objects.only(*SCORING_USER_FIELDS).in_bulk(user_ids)
+    
+    pairs = [m for m in matches if m.user_a_id in users and m.user_b_id in users]
+    scores = engine.score_pairs(
+        [users[m.user_a_id] for m in pairs],
+        [users[m.user_b_id] for m in pairs],
+    )
+    
+    changed = []
+    for match, score in zip(pairs, scores):
+        score = float(score)
+        if match.match_score != score:
+            match.match_score = score
+            changed.append(match)
+    
+    Match.objects.bulk_update(changed, ['match_score'], batch_size=len(matches))
+    return len(changed)
+
+@shared_task
+def rescore_match_shard(shard, shards, run_id, chunk_size=2000):
+    engine = MatchingEngine()
+    if run_id != _rescore_run_id(engine):
+        logger.warning(f"Skipping rescore shard {shard}: run {run_id} no longer matches current weights")
+        return 0
+    
+    r = get_redis()
+    checkpoint_key = f'rescore_matches:{run_id}:{shard}'
+    cursor = r.get(checkpoint_key)
+    if cursor == 'done':
+        return 0
+    
+    low, high = _shard_bounds(shard, shards)
+    matches = Match.objects.filter(id__gte=low)
+    if high is not None:
+        matches = matches.filter(id__lt=high)
+    if cursor:
+        matches = matches.filter(id__gt=uuid.UUID(cursor))
+    
+    matches = matches.order_by('id').only(
+        'id', 'user_a', 'user_b', 'match_score'
+    ).iterator(chunk_size=chunk_size)
+    
+    scanned = updated = 0
+    chunk = []
+    for match in matches:
+        chunk.append(match)
+        if len(chunk) >= chunk_size:
+            updated += _rescore_chunk(engine, chunk)
+            scanned += len(chunk)
+            r.set(checkpoint_key, str(chunk[-1].id), ex=RESCORE_CHECKPOINT_TTL)
+            chunk = []
+    
+    if chunk:
+        updated += _rescore_chunk(engine, chunk)
+        scanned += len(chunk)
+    r.set(checkpoint_key, 'done', ex=RESCORE_CHECKPOINT_TTL)
+    
+    logger.info(f"Rescored shard {shard}/{shards} of run {run_id}: {scanned} scanned, {updated} updated")
+    return updated
+
+@shared_task
+def rescore_matches(shards=16, chunk_size=2000, restart=False):
+    run_id = _rescore_run_id(MatchingEngine())
+    if restart:
+        r = get_redis()
+        r.delete(*[f'rescore_matches:{run_id}:{shard}' for shard in range(shards)])
+    
+    group(
+        rescore_match_shard.s(shard, shards, run_id, chunk_size)
+        for shard in range(shards)
+    ).apply_async()
+    logger.info(f"Queued match rescore run {run_id} across {shards} shards")
+    return run_id
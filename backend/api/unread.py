@@ -0,0 +1,149 @@
+from django.db.models import Count
+from .models import ChatMessage, ChatRoom, Notification
+from .redis_client import get_redis, get_async_redis
+from redis.exceptions import RedisError
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Per-user hash of unread counts: NOTIFICATIONS holds unread, undismissed
+# notifications and every other field is a chat room id mapped to unseen
+# messages from the other participant. A hash only exists once it was
+# loaded from the database (NOTIFICATIONS is always written), and the
+# scripts leave missing hashes alone, so a partial count is never served.
+# reconcile_unread_counters rewrites them from the database to undo drift.
+
+NOTIFICATIONS = 'notifications'
+
+_ADJUST_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+local value = redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+if value <= 0 and ARGV[1] ~= 'notifications' then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+elseif value < 0 then
+    redis.call('HSET', KEYS[1], ARGV[1], 0)
+end
+return value
+"""
+
+def unread_key(user_id):
+    return f'unread:{user_id}'
+
+def _adjust(user_id, field, delta):
+    try:
+        r = get_redis()
+        r.register_script(_ADJUST_SCRIPT)(keys=[unread_key(user_id)], args=[str(field), delta])
+    except RedisError as e:
+        logger.warning(f"Failed to update unread counter for user {user_id}: {str(e)}")
+
+async def _adjust_async(user_id, field, delta):
+    try:
+        r = get_async_redis()
+        await r.register_script(_ADJUST_SCRIPT)(keys=[unread_key(user_id)], args=[str(field), delta])
+    except RedisError as e:
+        logger.warning(f"Failed to update unread counter for user {user_id}: {str(e)}")
+
+def notification_created(user_id, count=1):
+    _adjust(user_id, NOTIFICATIONS, count)
+
+def notifications_created(user_ids):
+    # One round trip for a bulk fan-out; repeated ids count once each.
+    try:
+        r = get_redis()
+        script = r.register_script(_ADJUST_SCRIPT)
+        pipe = r.pipeline(transaction=False)
+        for user_id in user_ids:
+            script(keys=[unread_key(user_id)], args=[NOTIFICATIONS, 1], client=pipe)
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Failed to update unread notification counters: {str(e)}")
+
+def notification_cleared(user_id, count=1):
+    _adjust(user_id, NOTIFICATIONS, -count)
+
+def message_created(room_id, recipient_id, count=1):
+    _adjust(recipient_id, room_id, count)
+
+async def message_created_async(room_id, recipient_id, count=1):
+    await _adjust_async(recipient_id, room_id, count)
+
+def messages_seen(room_id, user_id, count):
+    _adjust(user_id, room_id, -count)
+
+async def messages_seen_async(room_id, user_id, count):
+    await _adjust_async(user_id, room_id, -count)
+
+def _counts_from_db(user_ids=None):
+    counts = {}
+    
+    notifications = Notification.objects.filter(is_read=False, is_dismissed=False)
+    if user_ids is not None:
+        notifications = notifications.filter(user_id__in=user_ids)
+    for user_id, count in notifications.values_list('user_id').annotate(count=Count('id')).order_by():
+        counts.setdefault(user_id, {})[NOTIFICATIONS] = count
+    
+    messages = ChatMessage.objects.filter(is_seen=False, is_deleted=False, room__is_deleted=False)
+    if user_ids is not None:
+        rooms = ChatRoom.objects.filter(user_a_id__in=user_ids) | ChatRoom.objects.filter(user_b_id__in=user_ids)
+        messages = messages.filter(room__in=rooms)
+    rows = messages.values_list(
+        'room_id', 'room__user_a_id', 'room__user_b_id', 'sender_id'
+    ).annotate(count=Count('id')).order_by()
+    for room_id, user_a_id, user_b_id, sender_id, count in rows:
+        recipient_id = user_b_id if sender_id == user_a_id else user_a_id
+        if user_ids is None or recipient_id in user_ids:
+            counts.setdefault(recipient_id, {})[str(room_id)] = count
+    
+    return counts
+
+def _write(pipe, user_id, fields):
+    key = unread_key(user_id)
+    pipe.delete(key)
+    pipe.hset(key, mapping={NOTIFICATIONS: 0, **fields})
+
+def get_counts(user_id):
+    r = get_redis()
+    try:
+        fields = r.hgetall(unread_key(user_id))
+    except RedisError as e:
+        logger.warning(f"Failed to read unread counters: {str(e)}")
+        fields = None
+    
+    if not fields:
+        fields = {NOTIFICATIONS: 0, **_counts_from_db([user_id]).get(user_id, {})}
+        try:
+            pipe = r.pipeline()
+            _write(pipe, user_id, fields)
+            pipe.execute()
+        except RedisError:
+            pass
+    
+    rooms = {
+        field: int(value) for field, value in fields.items()
+        if field != NOTIFICATIONS and int(value) > 0
+    }
+    return {
+        'notifications': int(fields.get(NOTIFICATIONS, 0)),
+        'chats': sum(rooms.values()),
+        'rooms': rooms,
+    }
+
+def reconcile():
+    r = get_redis()
+    counts = _counts_from_db()
+    
+    # Only hashes that are already loaded are rewritten; the rest are
+    # filled in lazily by get_counts.
+    rewritten = 0
+    pipe = r.pipeline()
+    for key in r.scan_iter(match=unread_key('*'), count=1000):
+        user_id = int(key.rpartition(':')[2])
+        _write(pipe, user_id, counts.get(user_id, {}))
+        rewritten += 1
+        if rewritten % 1000 == 0:
+            pipe.execute()
+    pipe.execute()
+    
+    return rewritten
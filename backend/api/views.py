@@ -5,9 +5,18 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
-from datetime import timedelta
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.core.exceptions import ValidationError
+from datetime import datetime, timedelta, timezone as dt_timezone
+from redis.exceptions import RedisError
 import logging
+import secrets
+import uuid
 
 from .models import (
     User, EmailVerification, InstitutionDomain, MatchProfile, Match, ChatRoom,
@@ -16,16 +25,20 @@ from .models import (
 )
 from .serializers import (
     UserRegistrationSerializer, OTPVerificationSerializer, UserProfileSerializer,
-    MatchProfileSerializer, MatchSerializer, ChatRoomSerializer, ChatMessageSerializer,
+    MatchProfileSerializer, MatchSerializer, ChatRoomSerializer, InboxRoomSerializer, ChatMessageSerializer,
     StickerSerializer, GiftSerializer, SentGiftSerializer, NotificationSerializer,
     AdminUserListSerializer, TokenTransactionSerializer
 )
-from .tasks import send_otp_email
+from .tasks import send_otp_email, queue_feed_refresh
 from .matching import MatchingEngine
+from .instrumentation import matching_metrics, matching_stage
+from . import chat_expiry, feed, match_exclusions, room_activity, unread
 from .admin_auth import AdminAuthentication
 
 logger = logging.getLogger(__name__)
 
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
 def register(request):
@@ -138,6 +151,21 @@ class UserProfileViewSet(viewsets.ViewSet):
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+SEED_MASK = (1 << 64) - 1
+
+def _int_param(request, name, default):
+    try:
+        return int(request.query_params.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+def _remove_from_feeds(user_a_id, user_b_id):
+    # Runs after commit; a cache outage must not turn the committed match into a 500.
+    try:
+        feed.remove_pair(user_a_id, user_b_id)
+    except RedisError as e:
+        logger.warning(f"Failed to remove matched pair from feeds: {str(e)}")
+
 class MatchingViewSet(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
     
@@ -147,11 +175,55 @@ class MatchingViewSet(viewsets.ViewSet):
         if not user.match_profile or not user.match_profile.is_active:
             return Response({'error': 'Match profile not configured'}, status=status.HTTP_400_BAD_REQUEST)
         
-        engine = MatchingEngine()
-        candidates = engine.find_candidates(user)
+        page_size = min(max(_int_param(request, 'limit', 50), 1), 100)
+        page = max(_int_param(request, 'page', 1), 1)
+        offset = (page - 1) * page_size
         
-        serializer = MatchSerializer(candidates, many=True)
-        return Response(serializer.data)
+        engine = MatchingEngine()
+        seed = request.query_params.get('seed')
+        if seed is not None:
+            try:
+                # Seeds are splitmix64 inputs, so anything wider is reduced.
+                seed = int(seed) & SEED_MASK
+            except ValueError:
+                seed = None
+        
+        if seed is None:
+            try:
+                with matching_stage('feed_read'):
+                    ranked = feed.read_feed(user.id, offset, page_size)
+            except RedisError as e:
+                logger.warning(f"Match feed unavailable: {str(e)}")
+                ranked = None
+            
+            if ranked is not None:
+                candidates = engine.load_candidates(ranked)
+                with matching_stage('serialize'):
+                    data = MatchSerializer(candidates, many=True).data
+                return Response(data, headers={'X-Matching-Source': 'feed'})
+            
+            queue_feed_refresh(user.id)
+        
+        if seed is None:
+            try:
+                seed = cache.get_or_set(
+                    f'matching_seed_{user.id}',
+                    lambda: secrets.randbits(32),
+                    settings.MATCHING_SEED_TTL,
+                )
+            except RedisError as e:
+                # Pages may reshuffle until the cache is back; the live path still answers.
+                logger.warning(f"Matching seed cache unavailable: {str(e)}")
+                seed = secrets.randbits(32)
+        
+        candidates = engine.find_candidates(user, limit=page_size, offset=offset, seed=seed)
+        
+        with matching_stage('serialize'):
+            data = MatchSerializer(candidates, many=True).data
+        return Response(data, headers={
+            'X-Matching-Source': 'live',
+            'X-Matching-Seed': str(seed),
+        })
     
     @action(detail=False, methods=['post'])
     def create_match(self, request):
@@ -192,6 +264,7 @@ class MatchingViewSet(viewsets.ViewSet):
             )
             match.chat_room = chat_room
             match.save(update_fields=['chat_room'])
+            transaction.on_commit(lambda: chat_expiry.schedule([(chat_room.id, chat_room.expires_at)]))
             
             Notification.objects.create(
                 user=target,
@@ -199,26 +272,83 @@ class MatchingViewSet(viewsets.ViewSet):
                 title='New Match!',
                 body='You have a new match!',
             )
+            
+            transaction.on_commit(lambda: _remove_from_feeds(user.id, target.id))
+            transaction.on_commit(lambda: match_exclusions.add_match(match))
         
         return Response(MatchSerializer(match).data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
+def _inbox_queryset(user):
+    # Participants, last message and unread count in the same query as the rooms.
+    messages = ChatMessage.objects.filter(room=OuterRef('pk'), is_deleted=False)
+    last_message = messages.order_by('-created_at', '-id')
+    unread = messages.filter(is_seen=False).exclude(sender=user).values('room').annotate(
+        count=Count('id')
+    ).values('count')
+    
+    return ChatRoom.objects.select_related('user_a', 'user_b').annotate(
+        last_message_preview=Subquery(last_message.values('content')[:1]),
+        last_message_type=Subquery(last_message.values('message_type')[:1]),
+        last_message_at=Subquery(last_message.values('created_at')[:1]),
+        unread_count=Coalesce(Subquery(unread, output_field=IntegerField()), 0),
+    )
+
+def _inbox_cursor(last_activity, room_id):
+    micros = (last_activity - EPOCH) // timedelta(microseconds=1)
+    return f'{micros}_{room_id}'
+
+INBOX_PAGE_SIZE = 20
+
+def _parse_inbox_cursor(cursor):
+    micros, _, room_id = cursor.partition('_')
+    return (EPOCH + timedelta(microseconds=int(micros)), uuid.UUID(room_id))
+
 class ChatRoomViewSet(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
     
     def list(self, request):
         user = request.user
-        rooms = ChatRoom.objects.filter(
+        rooms = _inbox_queryset(user).filter(
             Q(user_a=user) | Q(user_b=user),
             is_deleted=False
-        ).order_by('-last_activity')
-        
-        page_size = 20
-        paginator = request.query_params.get('page', 1)
-        offset = (int(paginator) - 1) * page_size
-        
-        rooms = rooms[offset:offset + page_size]
-        serializer = ChatRoomSerializer(rooms, many=True)
-        return Response(serializer.data)
+        ).order_by('-last_activity', '-id')
+        
+        # Keyset mode: ?before=<X-Next-Cursor> continues after the last room
+        # of the previous page on (last_activity, id), compared in SQL.
+        before = request.query_params.get('before')
+        if before:
+            try:
+                cursor = _parse_inbox_cursor(before)
+            except (ValueError, OverflowError):
+                return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+            rooms = rooms.filter(
+                Q(last_activity__lt=cursor[0]) | Q(last_activity=cursor[0], id__lt=cursor[1])
+            )
+        else:
+            offset = (max(_int_param(request, 'page', 1), 1) - 1) * INBOX_PAGE_SIZE
+            rooms = rooms[offset:]
+        
+        page = list(rooms[:INBOX_PAGE_SIZE + 1])
+        has_more = len(page) > INBOX_PAGE_SIZE
+        page = page[:INBOX_PAGE_SIZE]
+        next_cursor = _inbox_cursor(page[-1].last_activity, page[-1].id) if has_more else None
+        
+        # Coalesced bumps not yet flushed to the column take precedence. A
+        # room bumped past the cursor is already above it, so it is dropped;
+        # one bumped from further down is placed when the flush lands.
+        rooms_by_id = {room.id: room for room in page}
+        for room_id, pending in room_activity.pending_activity(rooms_by_id).items():
+            room = rooms_by_id[room_id]
+            if pending > room.last_activity:
+                room.last_activity = pending
+        if before:
+            page = [room for room in page if (room.last_activity, room.id) < cursor]
+        page.sort(key=lambda room: (room.last_activity, room.id), reverse=True)
+        
+        response = Response(InboxRoomSerializer(page, many=True).data)
+        if next_cursor:
+            response['X-Next-Cursor'] = next_cursor
+        return response
     
     def retrieve(self, request, pk=None):
         user = request.user
@@ -253,11 +383,35 @@ class ChatRoomViewSet(viewsets.ViewSet):
             return Response({'error': 'Chat room is locked'}, status=status.HTTP_403_FORBIDDEN)
         
         page_size = 20
-        page = int(request.query_params.get('page', 1))
-        offset = (page - 1) * page_size
-        
-        messages = room.messages.filter(is_deleted=False).order_by('-created_at')[offset:offset + page_size]
-        serializer = ChatMessageSerializer(messages, many=True)
+        messages = room.messages.filter(is_deleted=False).select_related('sender')
+        
+        # Keyset mode: ?before=/?after=<message id> seek on (created_at, id)
+        # via the (room, created_at) index instead of scanning an offset.
+        before = request.query_params.get('before')
+        after = request.query_params.get('after')
+        if before or after:
+            try:
+                cursor = room.messages.filter(id=before or after).values_list('created_at', 'id').first()
+            except ValidationError:
+                cursor = None
+            if cursor is None:
+                return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            created_at, message_id = cursor
+            if before:
+                messages = messages.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=message_id)
+                ).order_by('-created_at', '-id')[:page_size]
+            else:
+                messages = reversed(messages.filter(
+                    Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=message_id)
+                ).order_by('created_at', 'id')[:page_size])
+        else:
+            page = int(request.query_params.get('page', 1))
+            offset = (page - 1) * page_size
+            messages = messages.order_by('-created_at', '-id')[offset:offset + page_size]
+        
+        serializer = ChatMessageSerializer(list(messages), many=True)
         return Response(serializer.data)
     
     @action(detail=True, methods=['post'])
@@ -286,7 +440,9 @@ class ChatRoomViewSet(viewsets.ViewSet):
             media_url=media_url,
         )
         
-        room.save(update_fields=['last_activity'])
+        room_activity.touch_room(room.id, message.created_at)
+        recipient_id = room.user_b_id if room.user_a_id == user.id else room.user_a_id
+        transaction.on_commit(lambda: unread.message_created(room.id, recipient_id))
         
         return Response(ChatMessageSerializer(message).data, status=status.HTTP_201_CREATED)
 
@@ -381,9 +537,12 @@ class NotificationViewSet(viewsets.ViewSet):
         
         try:
             notification = Notification.objects.get(id=notification_id, user=user)
+            was_unread = not notification.is_read and not notification.is_dismissed
             notification.is_read = True
             notification.read_at = timezone.now()
             notification.save(update_fields=['is_read', 'read_at'])
+            if was_unread:
+                transaction.on_commit(lambda: unread.notification_cleared(user.id))
             return Response({'status': 'marked as read'})
         except Notification.DoesNotExist:
             return Response({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -395,12 +554,36 @@ class NotificationViewSet(viewsets.ViewSet):
         
         try:
             notification = Notification.objects.get(id=notification_id, user=user)
+            was_unread = not notification.is_read and not notification.is_dismissed
             notification.is_dismissed = True
             notification.dismissed_at = timezone.now()
             notification.save(update_fields=['is_dismissed', 'dismissed_at'])
+            if was_unread:
+                transaction.on_commit(lambda: unread.notification_cleared(user.id))
             return Response({'status': 'dismissed'})
         except Notification.DoesNotExist:
             return Response({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        return Response(unread.get_counts(request.user.id))
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def matching_metrics_view(request):
+    if not settings.MATCHING_METRICS_ENABLED:
+        return Response({'error': 'Metrics disabled'}, status=status.HTTP_404_NOT_FOUND)
+    
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
+    
+    if request.query_params.get('format') == 'json':
+        return Response(matching_metrics.stats())
+    return HttpResponse(
+        matching_metrics.render_prometheus(),
+        content_type='text/plain; version=0.0.4',
+    )
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
@@ -9,9 +9,14 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
 app.conf.beat_schedule = {
+    'expire-due-chats': {
+        'task': 'api.tasks.expire_due_chats',
+        'schedule': 30.0,
+        'options': {'expires': 30},
+    },
     'expire-chats': {
         'task': 'api.tasks.expire_chats',
-        'schedule': crontab(minute='*/15'),
+        'schedule': crontab(minute='5'),
     },
     'send-payment-reminders': {
         'task': 'api.tasks.send_payment_reminders',
@@ -37,9 +42,23 @@ app.conf.beat_schedule = {
         'task': 'api.tasks.verify_subscriptions',
         'schedule': crontab(minute='*/30'),
     },
-    'cleanup-typing-indicators': {
-        'task': 'api.tasks.cleanup_typing_indicators',
-        'schedule': crontab(minute='*/5'),
+    'refresh-match-feeds': {
+        'task': 'api.tasks.refresh_match_feeds',
+        'schedule': crontab(minute='0', hour='*/6'),
+    },
+    'persist-chat-messages': {
+        'task': 'api.tasks.persist_chat_messages',
+        'schedule': 5.0,
+        'options': {'expires': 5},
+    },
+    'reconcile-unread-counters': {
+        'task': 'api.tasks.reconcile_unread_counters',
+        'schedule': crontab(minute='30'),
+    },
+    'flush-room-activity': {
+        'task': 'api.tasks.flush_room_activity',
+        'schedule': 10.0,
+        'options': {'expires': 10},
     },
 }
 
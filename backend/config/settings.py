@@ -17,6 +17,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'corsheaders',
     'channels',
@@ -125,6 +126,18 @@ CORS_ALLOWED_ORIGINS = os.environ.get(
     'http://localhost:3000,http://127.0.0.1:3000'
 ).split(',')
 
+REDIS_URL = os.environ.get(
+    'REDIS_URL',
+    f"redis://{os.environ.get('REDIS_HOST', 'localhost')}:{os.environ.get('REDIS_PORT', 6379)}/0"
+)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    },
+}
+
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
@@ -167,6 +180,34 @@ LOGGING = {
 OTP_VALID_DURATION = 10 * 60
 APPROVED_DOMAINS = os.environ.get('APPROVED_DOMAINS', '').split(',') if os.environ.get('APPROVED_DOMAINS') else []
 
+MATCHING_INDEX_MAX_AGE = int(os.environ.get('MATCHING_INDEX_MAX_AGE', 300))
+MATCHING_SEED_TTL = int(os.environ.get('MATCHING_SEED_TTL', 30 * 60))
+MATCHING_FEED_SIZE = int(os.environ.get('MATCHING_FEED_SIZE', 200))
+MATCHING_FEED_TTL = int(os.environ.get('MATCHING_FEED_TTL', 12 * 60 * 60))
+MATCHING_FEED_REFRESH_DEBOUNCE = int(os.environ.get('MATCHING_FEED_REFRESH_DEBOUNCE', 60))
+MATCHING_ANN_ENABLED = os.environ.get('MATCHING_ANN_ENABLED', 'False') == 'True'
+MATCHING_ANN_MAX_AGE = int(os.environ.get('MATCHING_ANN_MAX_AGE', 15 * 60))
+MATCHING_ANN_TABLES = int(os.environ.get('MATCHING_ANN_TABLES', 8))
+MATCHING_METRICS_ENABLED = os.environ.get('MATCHING_METRICS_ENABLED', 'False') == 'True'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+TYPING_INDICATOR_TTL = int(os.environ.get('TYPING_INDICATOR_TTL', 10))
+TYPING_MIN_INTERVAL = int(os.environ.get('TYPING_MIN_INTERVAL', 1000))
+TYPING_IDLE_TIMEOUT = int(os.environ.get('TYPING_IDLE_TIMEOUT', 5))
+WS_RATE_LIMITS = {
+    'message': os.environ.get('WS_MESSAGE_RATE', '2/s'),
+    'typing': os.environ.get('WS_TYPING_RATE', '1/s'),
+    'seen': os.environ.get('WS_SEEN_RATE', '2/s'),
+}
+WS_RATE_BURST = int(os.environ.get('WS_RATE_BURST', 5))
+WS_RATE_LIMIT_CLOSE_AFTER = int(os.environ.get('WS_RATE_LIMIT_CLOSE_AFTER', 50))
+WS_GLOBAL_MESSAGE_RATE = int(os.environ.get('WS_GLOBAL_MESSAGE_RATE', 0))
+
+CLEANUP_BATCH_SIZE = int(os.environ.get('CLEANUP_BATCH_SIZE', 1000))
+CLEANUP_BATCH_PAUSE = float(os.environ.get('CLEANUP_BATCH_PAUSE', 0.1))
+CHAT_WRITE_BEHIND_ENABLED = os.environ.get('CHAT_WRITE_BEHIND_ENABLED', 'False') == 'True'
+CHAT_WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('CHAT_WRITE_BEHIND_BATCH_SIZE', 500))
+
 ADMIN_EMAIL = os.environ.get('ADMIN_EMAIL')
 ADMIN_PASSWORD_HASH = os.environ.get('ADMIN_PASSWORD_HASH')
 
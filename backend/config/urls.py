@@ -19,4 +19,5 @@ urlpatterns = [
     path('api/auth/resend-otp/', views.resend_otp, name='resend-otp'),
     path('api/gifts/send/', views.send_gift, name='send-gift'),
     path('api/abuse/report/', views.report_abuse, name='report-abuse'),
+    path('api/metrics/matching/', views.matching_metrics_view, name='matching-metrics'),
 ]